@@ -1,11 +1,27 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify
 from dotenv import load_dotenv
 from routes.checkout import checkout_bp
 from routes.shop import shop_bp
 from routes.cart import cart_bp
 from routes.auth import auth_bp
 from routes.admin import admin_bp
+from routes.images import images_bp
+from routes.assets import assets_bp
+from services.product_service import catalog_cache_stats, catalog_degraded
+from services.appwrite_gateway import gateway_stats
+from services.search_service import search_index
+from services.order_items_index import index_stats as order_items_index_stats, start_sync as start_order_items_sync
+from services.checkout_outbox import outbox_stats, start_worker as start_outbox_worker
+from services.image_proxy import image_proxy_stats
+from services.image_jobs import image_jobs_stats, start_workers as start_image_workers
+from services.image_manifest import image_sources, CARD_IMAGE_SIZES, DETAIL_IMAGE_SIZES
+from services.static_assets import static_url, critical_css
+from services.http_cache import conditional_get_stats
+from services.fragment_cache import fragment_cache_stats
+from services.invalidation_bus import bus_stats
+from services.replica import replica_stats, start_sync as start_replica_sync
+from services.deadline import deadline_stats
 # from routes.pages import pages_bp
 
 load_dotenv()  # carga .env
@@ -22,8 +38,34 @@ def create_app():
     app.register_blueprint(checkout_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(images_bp)
+    app.register_blueprint(assets_bp)
     # app.register_blueprint(pages_bp)
 
+    # srcset de imagenes responsive (templates/_macros.html)
+    app.add_template_global(image_sources)
+    app.add_template_global(CARD_IMAGE_SIZES, "CARD_IMAGE_SIZES")
+    app.add_template_global(DETAIL_IMAGE_SIZES, "DETAIL_IMAGE_SIZES")
+
+    # assets con hash + CSS critico (tools/build_assets.py)
+    app.add_template_global(static_url)
+    app.add_template_global(critical_css)
+
+    # aviso de modo degradado (Appwrite caido, catalogo guardado)
+    app.add_template_global(catalog_degraded)
+
+    # Worker que pasa los pedidos de la outbox local a Appwrite
+    start_outbox_worker()
+
+    # Workers que optimizan y suben las imagenes cargadas desde el admin
+    start_image_workers()
+
+    # Indice local order_id -> items: carga inicial + delta en segundo plano
+    start_order_items_sync()
+
+    # Replica local de lectura (solo si REPLICA_ENABLED)
+    start_replica_sync()
+
     # Debug: lista rutas registradas
     @app.get("/debug/routes")
     def debug_routes():
@@ -31,6 +73,24 @@ def create_app():
             "Content-Type": "text/plain; charset=utf-8"
         }
 
+    # Debug: contadores de caches / servicios
+    @app.get("/debug/stats")
+    def debug_stats():
+        return jsonify({
+            "catalog_cache": catalog_cache_stats(),
+            "appwrite_gateway": gateway_stats(),
+            "search_index": search_index.stats(),
+            "order_items_index": order_items_index_stats(),
+            "checkout_outbox": outbox_stats(),
+            "image_jobs": image_jobs_stats(),
+            "image_proxy": image_proxy_stats(),
+            "conditional_get": conditional_get_stats(),
+            "fragment_cache": fragment_cache_stats(),
+            "invalidation_bus": bus_stats(),
+            "replica": replica_stats(),
+            "deadline": deadline_stats(),
+        })
+
     return app
 
 app = create_app()
@@ -1,3 +1,6 @@
+import os
+import threading
+
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 from appwrite.services.storage import Storage
@@ -6,22 +9,39 @@ from appwrite.id import ID
 from config import config
 
 
+_client_lock = threading.Lock()
+_client_state = {"pid": None, "client": None, "databases": None, "storage": None}
+
+
 def get_appwrite_client() -> Client:
-    client = Client()
-    client.set_endpoint(config.APPWRITE_ENDPOINT)
-    client.set_project(config.APPWRITE_PROJECT_ID)
-    client.set_key(config.APPWRITE_API_KEY)
-    return client
+    """
+    Cliente SDK compartido por proceso (se recrea despues de un fork de gunicorn).
+    Para HTTP directo usar services/appwrite_gateway.py.
+    """
+    pid = os.getpid()
+    with _client_lock:
+        if _client_state["client"] is None or _client_state["pid"] != pid:
+            client = Client()
+            client.set_endpoint(config.APPWRITE_ENDPOINT)
+            client.set_project(config.APPWRITE_PROJECT_ID)
+            client.set_key(config.APPWRITE_API_KEY)
+            _client_state.update({
+                "pid": pid,
+                "client": client,
+                "databases": Databases(client),
+                "storage": Storage(client),
+            })
+        return _client_state["client"]
 
 
 def get_databases_service() -> Databases:
-    client = get_appwrite_client()
-    return Databases(client)
+    get_appwrite_client()
+    return _client_state["databases"]
 
 
 def get_storage_service() -> Storage:
-    client = get_appwrite_client()
-    return Storage(client)
+    get_appwrite_client()
+    return _client_state["storage"]
 
 
 # Helper para ID (lo usaremos despues para crear documentos)
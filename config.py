@@ -14,5 +14,95 @@ class Config:
     APPWRITE_API_KEY = os.getenv("APPWRITE_API_KEY", "").strip()
     APPWRITE_BUCKET_PRODUCT_IMAGES = os.getenv("APPWRITE_BUCKET_PRODUCT_IMAGES", "product-images").strip()
 
+    # Cache del catalogo (segundos). Pasado el TTL se sirve el snapshot viejo
+    # y se refresca en segundo plano.
+    CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+    # Paginacion del catalogo / categorias (productos por pagina)
+    CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24"))
+    CATALOG_MAX_PAGE_SIZE = int(os.getenv("CATALOG_MAX_PAGE_SIZE", "60"))
+
+    # Paginas de Appwrite pedidas en paralelo al listar una collection completa
+    # (1 = secuencial, como antes)
+    APPWRITE_PAGE_CONCURRENCY = int(os.getenv("APPWRITE_PAGE_CONCURRENCY", "4"))
+
+    # Datos locales (indices SQLite, snapshots, colas). Fuera del repo.
+    DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "instance")).strip()
+
+    # Indice local order_id -> items: cada cuanto (segundos) se trae lo nuevo de Appwrite
+    ORDER_ITEMS_SYNC_INTERVAL = int(os.getenv("ORDER_ITEMS_SYNC_INTERVAL", "30"))
+
+    # Checkout: order_items escritos en paralelo (max N a la vez) y tiempo
+    # maximo (segundos) para escribir el pedido completo
+    CHECKOUT_WRITE_CONCURRENCY = int(os.getenv("CHECKOUT_WRITE_CONCURRENCY", "6"))
+    CHECKOUT_DEADLINE = float(os.getenv("CHECKOUT_DEADLINE", "15"))
+
+    # Outbox del checkout: reintentos hacia Appwrite (segundos)
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "5"))
+    OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "600"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "50"))
+    # pedidos ya escritos que se guardan en la outbox antes de borrarlos (7 dias)
+    OUTBOX_DONE_RETENTION = float(os.getenv("OUTBOX_DONE_RETENTION", "604800"))
+
+    # Carrito en el servidor: "sqlite" (compartido entre workers) o "memory" (LRU, dev)
+    CART_BACKEND = os.getenv("CART_BACKEND", "sqlite").strip()
+    CART_MEMORY_MAX = int(os.getenv("CART_MEMORY_MAX", "10000"))
+
+    # Imagenes subidas desde el admin: cola local + workers que optimizan antes de subir al bucket
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    IMAGE_MASTER_MAX_SIDE = int(os.getenv("IMAGE_MASTER_MAX_SIDE", "1600"))
+    IMAGE_THUMB_WIDTHS = [int(w) for w in os.getenv("IMAGE_THUMB_WIDTHS", "320,640").split(",") if w.strip()]
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+    IMAGE_MAX_ATTEMPTS = int(os.getenv("IMAGE_MAX_ATTEMPTS", "5"))
+    # trabajos terminados que se guardan en la cola antes de borrarlos (7 dias)
+    IMAGE_JOBS_DONE_RETENTION = float(os.getenv("IMAGE_JOBS_DONE_RETENTION", "604800"))
+
+    # Proxy /img/<file_id> con cache en disco (services/image_proxy.py).
+    # IMAGE_PROXY_ENABLED=0 vuelve a apuntar directo a Appwrite.
+    IMAGE_PROXY_ENABLED = os.getenv("IMAGE_PROXY_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+    IMAGE_PROXY_WIDTHS = [int(w) for w in os.getenv("IMAGE_PROXY_WIDTHS", "160,320,480,640,960,1280").split(",") if w.strip()]
+    IMAGE_PROXY_DEFAULT_WIDTH = int(os.getenv("IMAGE_PROXY_DEFAULT_WIDTH", "640"))
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+    # Assets con hash (tools/build_assets.py): inlinear CSS critico en el <head>
+    STATIC_INLINE_CRITICAL_CSS = os.getenv("STATIC_INLINE_CRITICAL_CSS", "0").strip().lower() in ("1", "true", "yes")
+
+    # Cache de HTML renderizado de la tienda (services/fragment_cache.py), por proceso
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "500"))
+    FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("FRAGMENT_CACHE_MAX_MB", "32")) * 1024 * 1024
+
+    # Replica local de lectura (services/replica.py): delta sync por $updatedAt +
+    # reconcile de borrados. Con REPLICA_ENABLED=0 todo se lee de Appwrite.
+    REPLICA_ENABLED = os.getenv("REPLICA_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+    REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "30"))
+    REPLICA_RECONCILE_INTERVAL = float(os.getenv("REPLICA_RECONCILE_INTERVAL", "600"))
+    # si el ultimo sync es mas viejo que esto, los services vuelven a leer de Appwrite
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "300"))
+
+    # Gateway HTTP (services/appwrite_gateway.py)
+    APPWRITE_POOL_SIZE = int(os.getenv("APPWRITE_POOL_SIZE", "10"))
+    APPWRITE_TIMEOUT_CONNECT = float(os.getenv("APPWRITE_TIMEOUT_CONNECT", "5"))
+    APPWRITE_TIMEOUT_READ = float(os.getenv("APPWRITE_TIMEOUT_READ", "20"))
+    APPWRITE_TIMEOUT_WRITE = float(os.getenv("APPWRITE_TIMEOUT_WRITE", "20"))
+    APPWRITE_TIMEOUT_UPLOAD = float(os.getenv("APPWRITE_TIMEOUT_UPLOAD", "60"))
+    APPWRITE_RETRIES = int(os.getenv("APPWRITE_RETRIES", "2"))
+    APPWRITE_RETRY_BACKOFF = float(os.getenv("APPWRITE_RETRY_BACKOFF", "0.3"))
+    # Circuit breaker de lecturas: N fallas seguidas (o respuestas mas lentas que
+    # SLOW_CALL segundos) lo abren; despues de RESET segundos se prueba una request
+    APPWRITE_BREAKER_FAILURES = int(os.getenv("APPWRITE_BREAKER_FAILURES", "5"))
+    APPWRITE_BREAKER_SLOW_CALL = float(os.getenv("APPWRITE_BREAKER_SLOW_CALL", "8"))
+    APPWRITE_BREAKER_RESET = float(os.getenv("APPWRITE_BREAKER_RESET", "30"))
+    # Hedging de lecturas: si un GET tarda mas que el p95 de las ultimas
+    # HEDGE_WINDOW lecturas (minimo HEDGE_MIN_DELAY segundos) se manda otro igual
+    APPWRITE_HEDGE_ENABLED = os.getenv("APPWRITE_HEDGE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+    APPWRITE_HEDGE_MIN_DELAY = float(os.getenv("APPWRITE_HEDGE_MIN_DELAY", "0.2"))
+    APPWRITE_HEDGE_WINDOW = int(os.getenv("APPWRITE_HEDGE_WINDOW", "200"))
+
+    # Presupuesto de tiempo por request (segundos, services/deadline.py): todas las
+    # llamadas a Appwrite de una vista comparten este tiempo. 0 = sin limite
+    REQUEST_BUDGET_SHOP = float(os.getenv("REQUEST_BUDGET_SHOP", "8"))
+    REQUEST_BUDGET_ADMIN = float(os.getenv("REQUEST_BUDGET_ADMIN", "15"))
+
 
 config = Config()
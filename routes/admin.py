@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, redirect, session, flash, request
+from config import config
 from services.product_service import list_products, create_product, get_product, delete_product_cascade
-from services.order_service import list_orders, get_order_items, update_order_status
+from services.order_service import list_orders, get_order_detail, update_order_status
+from services.image_jobs import enqueue_product_image, product_image_status, retry_product_jobs, cancel_product_jobs
+from services.deadline import request_budget
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -21,6 +24,7 @@ def require_admin():
 
 
 @admin_bp.get("/")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def dashboard():
     guard = require_admin()
     if guard:
@@ -29,16 +33,23 @@ def dashboard():
 
 
 @admin_bp.get("/products")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_products():
     guard = require_admin()
     if guard:
         return guard
 
     products = list_products()
-    return render_template("admin/products.html", products=products)
+    try:
+        image_status = product_image_status([p.get("$id") for p in products])
+    except Exception as e:
+        print("ERROR leyendo estado de imagenes:", e)
+        image_status = {}
+    return render_template("admin/products.html", products=products, image_status=image_status)
 
 
 @admin_bp.get("/products/new")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_product_new():
     guard = require_admin()
     if guard:
@@ -47,6 +58,7 @@ def admin_product_new():
 
 
 @admin_bp.post("/products/new")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_product_create():
     guard = require_admin()
     if guard:
@@ -88,11 +100,10 @@ def admin_product_create():
             flash("La imagen es obligatoria. Producto no fue creado.", "error")
             return redirect("/admin/products/new")
 
-        # 3) Subir imagen + linkear
-        from services.product_images_service import upload_and_link_product_image
-        upload_and_link_product_image(product_id, image_file)
+        # 3) Encolar imagen: se optimiza y se sube al bucket en segundo plano
+        enqueue_product_image(product_id, image_file)
 
-        flash("Producto creado con imagen.", "success")
+        flash("Producto creado. La imagen se esta procesando.", "success")
         return redirect("/admin/products")
 
     except Exception as e:
@@ -103,6 +114,7 @@ def admin_product_create():
 
 
 @admin_bp.get("/orders")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_orders():
     guard = require_admin()
     if guard:
@@ -113,51 +125,31 @@ def admin_orders():
 
 
 @admin_bp.get("/orders/<order_id>")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_order_detail(order_id):
     guard = require_admin()
     if guard:
         return guard
 
-    orders = list_orders(limit=200)
-    order = None
-    for o in orders:
-        if (o.get("$id") or "") == order_id:
-            order = o
-            break
+    try:
+        detail = get_order_detail(order_id)
+    except Exception as e:
+        flash(f"No se pudo cargar el pedido: {str(e)}", "error")
+        return redirect("/admin/orders")
 
-    if not order:
+    if not detail:
         flash("Pedido no encontrado.", "error")
         return redirect("/admin/orders")
 
-    items = get_order_items(order_id)
-
-    # ✅ Adjuntar imagen a cada item (usando product_id -> get_product -> image_url)
-    from services.product_service import get_product
-
-    total = 0
-    for it in items:
-        # total
-        try:
-            total += float(it.get("subtotal") or 0)
-        except:
-            pass
-
-        # imagen
-        pid = (it.get("product_id") or "").strip()
-        if pid:
-            p = get_product(pid)
-            it["image_url"] = (p.get("image_url") or "").strip()
-        else:
-            it["image_url"] = ""
-
     return render_template(
         "admin/order_detail.html",
-        order=order,
-        items=items,
-        total=int(total)
+        order=detail["order"],
+        items=detail["items"],
+        total=detail["total"]
     )
 
 @admin_bp.post("/orders/<order_id>/status")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_order_status(order_id):
     guard = require_admin()
     if guard:
@@ -173,15 +165,31 @@ def admin_order_status(order_id):
     return redirect(f"/admin/orders/{order_id}")
 
 @admin_bp.post("/products/<product_id>/delete")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
 def admin_product_delete(product_id):
     guard = require_admin()
     if guard:
         return guard
 
     try:
+        cancel_product_jobs(product_id)
         delete_product_cascade(product_id)
         flash("Producto eliminado.", "success")
     except Exception as e:
         flash(f"No se pudo eliminar el producto: {str(e)}", "error")
 
     return redirect("/admin/products")
+
+
+@admin_bp.post("/products/<product_id>/image/retry")
+@request_budget(config.REQUEST_BUDGET_ADMIN)
+def admin_product_image_retry(product_id):
+    guard = require_admin()
+    if guard:
+        return guard
+
+    if retry_product_jobs(product_id):
+        flash("Imagen encolada de nuevo.", "success")
+    else:
+        flash("No hay imagenes fallidas para este producto.", "error")
+    return redirect("/admin/products")
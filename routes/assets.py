@@ -0,0 +1,48 @@
+import mimetypes
+import os
+
+from flask import Blueprint, abort, make_response, request, send_file
+
+from services.static_assets import DIST_DIR, asset_info
+
+assets_bp = Blueprint("assets", __name__)
+
+# El nombre lleva el hash del contenido: se puede cachear para siempre
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# preferencia de encoding precomprimido (sufijo del archivo en static/dist)
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+@assets_bp.get("/assets/<path:filename>")
+def asset(filename):
+    info = asset_info(filename)
+    if not info:
+        abort(404)
+
+    etag = info["hash"][:20]
+    encoding = ""
+    accepted = request.accept_encodings
+    for name, suffix in ENCODINGS:
+        if name in info.get("encodings", []) and accepted[name]:
+            encoding = name
+            etag = f"{etag}-{name}"
+            path = os.path.join(DIST_DIR, filename + suffix)
+            break
+    else:
+        path = os.path.join(DIST_DIR, filename)
+
+    if etag in request.if_none_match:
+        resp = make_response("", 304)
+    else:
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        resp = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+
+    resp.set_etag(etag)
+    resp.vary.add("Accept-Encoding")
+    resp.cache_control.public = True
+    resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+    resp.cache_control.immutable = True
+    return resp
@@ -1,22 +1,29 @@
-from flask import Blueprint, render_template, request, redirect, session
-from services.order_service import create_order_from_cart
-from services.cart_service import totals, clear_cart, get_cart
+from flask import Blueprint, render_template, request, redirect, session, flash
+from config import config
+from services.checkout_outbox import enqueue_order_from_cart
+from services.cart_service import totals, clear_cart, get_cart, unavailable_items
 from routes.auth_guard import login_required
+from services.deadline import request_budget
 
 checkout_bp = Blueprint("checkout", __name__)
 
 @checkout_bp.get("/checkout")
 @login_required
+@request_budget(config.REQUEST_BUDGET_SHOP)
 def checkout_page():
     cart = get_cart()
     if not cart or len(cart) == 0:
         return redirect("/carrito")
+    if unavailable_items():
+        flash("Hay productos no disponibles en tu carrito. Eliminalos para continuar.", "error")
+        return redirect("/carrito")
 
     t = totals()
     return render_template("checkout.html", totals=t)
 
 @checkout_bp.post("/checkout")
 @login_required
+@request_budget(config.REQUEST_BUDGET_SHOP)
 def checkout_submit():
     data = {
         "full_name": request.form.get("full_name", ""),
@@ -27,8 +34,20 @@ def checkout_submit():
         "notes": request.form.get("notes", ""),
     }
 
-    # Pasamos session_user para asociar el pedido al usuario logueado
-    result = create_order_from_cart(data, session.get("user"))
+    if unavailable_items():
+        flash("Hay productos no disponibles en tu carrito. Eliminalos para continuar.", "error")
+        return redirect("/carrito")
+
+    # Pasamos session_user para asociar el pedido al usuario logueado.
+    # El pedido queda en la outbox local y se escribe en Appwrite en segundo plano.
+    try:
+        result = enqueue_order_from_cart(data, session.get("user"))
+    except Exception as e:
+        # el carrito NO se vacia: el cliente puede reintentar.
+        # El detalle (Appwrite, SQLite...) va al log, no al cliente
+        print("ERROR checkout:", e)
+        flash("No pudimos registrar tu pedido, intenta de nuevo en unos minutos.", "error")
+        return redirect("/checkout")
 
     # vaciamos carrito al confirmar
     clear_cart()
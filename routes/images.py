@@ -0,0 +1,35 @@
+from flask import Blueprint, abort, make_response, request, send_file
+
+from services.image_proxy import etag_for, get_image, mimetype_for, snap_width, valid_file_id
+
+images_bp = Blueprint("images", __name__)
+
+# Los archivos del bucket no cambian: cache de un año en el navegador / CDN
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@images_bp.get("/img/<file_id>")
+def image(file_id):
+    if not valid_file_id(file_id):
+        abort(404)
+
+    width = snap_width(request.args.get("w"))
+    etag = etag_for(file_id, width)
+
+    if etag in request.if_none_match:
+        resp = make_response("", 304)
+    else:
+        try:
+            path = get_image(file_id, width)
+        except Exception as e:
+            print("ERROR proxy de imagen:", e)
+            abort(502)
+        if not path:
+            abort(404)
+        resp = send_file(path, mimetype=mimetype_for(path), conditional=False, etag=False)
+
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+    resp.cache_control.immutable = True
+    return resp
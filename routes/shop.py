@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, url_for
+from config import config
 from services.product_service import (
-    list_products,
-    list_categories,
-    list_products_by_category,
+    browse_products,
     get_product,
+    get_home_page,
+    paginate,
+    search_products,
 )
+from services.http_cache import conditional_catalog_page
+from services.fragment_cache import render_cached_page
+from services.deadline import request_budget
 
 shop_bp = Blueprint("shop", __name__)
 
@@ -39,29 +44,81 @@ CATEGORIES = [
 
 
 @shop_bp.get("/")
+@request_budget(config.REQUEST_BUDGET_SHOP)
+@conditional_catalog_page
 def home():
-    # Para la home: mostramos las categorias existentes (si Appwrite aun esta vacio, igual funciona)
-    categories = list_categories()
-
-    # Preview: max 6 productos por categoria
-    products_by_cat = {}
-    for c in categories:
-        products_by_cat[c] = (list_products_by_category(c) or [])[:6]
-
-    return render_template(
-        "home.html",
-        categories=categories,
-        products_by_cat=products_by_cat
-    )
+    # Para la home: categorias existentes + preview (max 6 por categoria),
+    # todo precalculado en el snapshot del catalogo (si Appwrite aun esta vacio, igual funciona)
+    def build_context():
+        page = get_home_page()
+        return {
+            "categories": page["categories"],
+            "products_by_cat": page["products_by_cat"],
+        }
+
+    return render_cached_page("home.html", build_context)
+
+
+@shop_bp.app_template_global()
+def page_url(page: int) -> str:
+    """
+    URL de la pagina actual cambiando solo ?page= (conserva el resto del querystring).
+    """
+    args = request.args.to_dict()
+    args.update(request.view_args or {})
+    args["page"] = page
+    return url_for(request.endpoint, **args)
+
+
+@shop_bp.app_template_global()
+def filter_url(name: str, value: str = "") -> str:
+    """
+    URL actual con un filtro cambiado (value vacio = quitar filtro). Vuelve a la pagina 1.
+    """
+    args = request.args.to_dict()
+    args.update(request.view_args or {})
+    args.pop("page", None)
+    if value:
+        args[name] = value
+    else:
+        args.pop(name, None)
+    return url_for(request.endpoint, **args)
 
 
 @shop_bp.get("/catalogo")
+@request_budget(config.REQUEST_BUDGET_SHOP)
+@conditional_catalog_page
 def catalogo():
-    products = list_products()
-    return render_template("catalog.html", products=products)
+    # Filtros/orden sobre los indices del snapshot + pagina: costo acotado
+    # sin importar el tamaño del catalogo. El HTML de la grilla queda cacheado por version.
+    def build_context():
+        browse = browse_products(filters=request.args)
+        pagination = paginate(
+            browse["products"],
+            request.args.get("page"),
+            request.args.get("per_page"),
+        )
+        return {"products": pagination["items"], "pagination": pagination, "browse": browse}
+
+    return render_cached_page("catalog.html", build_context)
+
+
+@shop_bp.get("/buscar")
+@request_budget(config.REQUEST_BUDGET_SHOP)
+def buscar():
+    q = (request.args.get("q") or "").strip()[:100]
+
+    def build_context():
+        products = search_products(q) if q else []
+        pagination = paginate(products, request.args.get("page"), request.args.get("per_page"))
+        return {"products": pagination["items"], "pagination": pagination}
+
+    return render_cached_page("search.html", build_context, q=q)
 
 
 @shop_bp.get("/categoria/<slug>")
+@request_budget(config.REQUEST_BUDGET_SHOP)
+@conditional_catalog_page
 def category(slug):
     slug = (slug or "").strip().lower()
 
@@ -72,21 +129,28 @@ def category(slug):
             "category.html",
             category_title="Categoria no encontrada",
             category_desc="Esa categoria no existe por ahora.",
-            products=[]
+            products=[],
+            pagination=None,
+            browse=None
         ), 404
 
-    # Pedimos productos directamente por categoria (mas limpio que listar todo y filtrar)
-    products = list_products_by_category(slug) or []
+    # Pedimos productos directamente por categoria (bitset de la categoria + filtros)
+    def build_context():
+        browse = browse_products(category=slug, filters=request.args)
+        pagination = paginate(browse["products"], request.args.get("page"), request.args.get("per_page"))
+        return {"products": pagination["items"], "pagination": pagination, "browse": browse}
 
-    return render_template(
+    return render_cached_page(
         "category.html",
+        build_context,
         category_title=cat["title"],
-        category_desc=cat["desc"],
-        products=products
+        category_desc=cat["desc"]
     )
 
 
 @shop_bp.get("/producto/<product_id>")
+@request_budget(config.REQUEST_BUDGET_SHOP)
+@conditional_catalog_page
 def producto_detalle(product_id):
     product_id = (product_id or "").strip()
     product = get_product(product_id)
@@ -0,0 +1,516 @@
+# services/appwrite_gateway.py
+"""
+Gateway HTTP unico hacia Appwrite.
+
+Todos los services pasan por aca para create/list/get/update/delete/upload:
+- una requests.Session por proceso (worker de gunicorn) con pool keep-alive
+- timeouts por tipo de operacion
+- reintentos con backoff para errores de red / 429 / 5xx
+- single-flight: lecturas identicas concurrentes comparten una sola request
+- circuit breaker en las lecturas: si Appwrite esta caido o muy lento se falla
+  rapido (CircuitOpenError) en vez de esperar el timeout en cada request
+- deadline: el timeout de cada llamada es lo que queda del presupuesto del
+  request (services/deadline); sin presupuesto -> DeadlineExceeded
+- hedging de GET idempotentes: si la respuesta tarda mas que el p95 reciente,
+  se manda una segunda request igual y gana la primera que responde
+- estadisticas de reuso de conexiones
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from appwrite.query import Query
+
+from config import config
+from services import deadline
+from services.circuit_breaker import CLOSED, CircuitBreaker
+from services.single_flight import SingleFlight
+
+
+class AppwriteError(RuntimeError):
+    def __init__(self, message: str, status_code: int = 0, text: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.text = text
+
+
+class CircuitOpenError(AppwriteError):
+    """
+    Lectura rechazada sin ir a la red: el circuit breaker esta abierto.
+    """
+
+
+class DeadlineExceeded(AppwriteError, deadline.DeadlineExceeded):
+    """
+    Se acabo el presupuesto de tiempo del request (services/deadline).
+    """
+
+
+_session_lock = threading.Lock()
+_session_state = {"pid": None, "session": None}
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "errors": 0, "deadline_exceeded": 0, "hedged": 0, "hedge_wins": 0}
+
+# Latencias recientes de lecturas exitosas (para el p95 del hedging)
+_latencies = deque(maxlen=config.APPWRITE_HEDGE_WINDOW)
+_hedge_state = {"pid": None, "pool": None}
+# presupuesto minimo (segundos) para lanzar la request de hedge
+HEDGE_MIN_BUDGET = 0.05
+# presupuesto minimo (segundos) para hacer una llamada: con menos el timeout
+# quedaria en 0 (requests lo rechaza con ValueError) o cortaria al instante
+MIN_CALL_BUDGET = 0.05
+
+# Lecturas (GET) identicas y concurrentes dentro del proceso se unen en una sola
+_reads = SingleFlight()
+
+# Circuit breaker de las lecturas (GET) del proceso
+_read_breaker = CircuitBreaker(
+    failure_threshold=config.APPWRITE_BREAKER_FAILURES,
+    reset_timeout=config.APPWRITE_BREAKER_RESET,
+    slow_call=config.APPWRITE_BREAKER_SLOW_CALL,
+)
+
+
+def _timeout(op: str):
+    read = {
+        "read": config.APPWRITE_TIMEOUT_READ,
+        "write": config.APPWRITE_TIMEOUT_WRITE,
+        "upload": config.APPWRITE_TIMEOUT_UPLOAD,
+    }.get(op, config.APPWRITE_TIMEOUT_READ)
+    # dentro de un request con presupuesto: nunca mas de lo que queda
+    return (deadline.cap(config.APPWRITE_TIMEOUT_CONNECT), deadline.cap(read))
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=config.APPWRITE_RETRIES,
+        connect=config.APPWRITE_RETRIES,
+        read=config.APPWRITE_RETRIES,
+        status=config.APPWRITE_RETRIES,
+        backoff_factor=config.APPWRITE_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # POST/PATCH no son idempotentes: solo se reintentan si no se llego a conectar
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=config.APPWRITE_POOL_SIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "X-Appwrite-Project": config.APPWRITE_PROJECT_ID,
+        "X-Appwrite-Key": config.APPWRITE_API_KEY,
+    })
+    return session
+
+
+def _session() -> requests.Session:
+    """
+    Session compartida del proceso. Si gunicorn hizo fork, se crea otra
+    (los sockets del padre no se comparten).
+    """
+    pid = os.getpid()
+    session = _session_state["session"]
+    if session is not None and _session_state["pid"] == pid:
+        return session
+
+    with _session_lock:
+        if _session_state["session"] is None or _session_state["pid"] != pid:
+            _session_state["session"] = _build_session()
+            _session_state["pid"] = pid
+        return _session_state["session"]
+
+
+def _base() -> str:
+    return (config.APPWRITE_ENDPOINT or "").strip().rstrip("/")
+
+
+def _collection_base(collection_id: str) -> str:
+    return f"{_base()}/databases/{config.APPWRITE_DATABASE_ID}/collections/{collection_id}/documents"
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    pid = os.getpid()
+    if _hedge_state["pid"] != pid:
+        with _session_lock:
+            if _hedge_state["pid"] != pid:
+                _hedge_state["pool"] = ThreadPoolExecutor(
+                    max_workers=config.APPWRITE_POOL_SIZE, thread_name_prefix="appwrite-hedge",
+                )
+                _hedge_state["pid"] = pid
+    return _hedge_state["pool"]
+
+
+def _hedge_delay():
+    """
+    p95 de las lecturas recientes (minimo APPWRITE_HEDGE_MIN_DELAY), o None si hay pocas muestras.
+    """
+    with _stats_lock:
+        samples = sorted(_latencies)
+    if len(samples) < 20:
+        return None
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return max(config.APPWRITE_HEDGE_MIN_DELAY, p95)
+
+
+def _perform(method: str, url: str, timeout, hedge: bool, kwargs: dict):
+    """
+    Ejecuta la request. Con hedge: si no respondio en el p95, se lanza una
+    segunda igual y se usa la primera que responde bien (la otra se descarta).
+    """
+    delay = _hedge_delay() if hedge and config.APPWRITE_HEDGE_ENABLED else None
+    left = deadline.remaining()
+    if delay is None or (left is not None and left - delay < HEDGE_MIN_BUDGET):
+        return _session().request(method, url, timeout=timeout, **kwargs)
+
+    pool = _hedge_pool()
+    first = pool.submit(_session().request, method, url, timeout=timeout, **kwargs)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+
+    # la segunda solo si queda presupuesto util (urllib3 no acepta timeout 0)
+    left = deadline.remaining()
+    if left is not None and left < HEDGE_MIN_BUDGET:
+        return first.result()
+
+    # el timeout de la segunda: lo que queda del presupuesto (no volver a empezar de cero)
+    second = pool.submit(_session().request, method, url, timeout=_timeout("read"), **kwargs)
+    with _stats_lock:
+        _stats["hedged"] += 1
+
+    error = None
+    for future in as_completed([first, second]):
+        try:
+            r = future.result()
+        except requests.RequestException as e:
+            error = e
+            continue
+        loser = first if future is second else second
+        loser.add_done_callback(_close_response)
+        if future is second:
+            with _stats_lock:
+                _stats["hedge_wins"] += 1
+        return r
+    raise error
+
+
+def _close_response(future):
+    """
+    Cierra la respuesta descartada del hedge: su conexion vuelve al pool.
+    """
+    if future.exception() is None:
+        future.result().close()
+
+
+def _request(method: str, url: str, op: str, what: str, allow_404: bool = False, **kwargs):
+    r = _send(method, url, op, what, allow_404=allow_404, **kwargs)
+    if r is None:
+        return None
+    if r.status_code == 204 or not r.content:
+        return {}
+    return r.json()
+
+
+def _deadline_exceeded(what: str):
+    deadline.record_exceeded()
+    with _stats_lock:
+        _stats["deadline_exceeded"] += 1
+    return DeadlineExceeded(f"Appwrite {what}: se acabo el tiempo del request")
+
+
+def _send(method: str, url: str, op: str, what: str, allow_404: bool = False, hedge: bool = False, **kwargs):
+    """
+    Request crudo: retorna la respuesta (o None si 404 y allow_404). Errores -> AppwriteError.
+    Los GET pasan por el circuit breaker: abierto -> CircuitOpenError sin tocar la red.
+    hedge=True solo para GET idempotentes (ver _perform).
+    """
+    timeout = _timeout(op)
+    if min(timeout) < MIN_CALL_BUDGET:
+        raise _deadline_exceeded(what)
+
+    breaker = _read_breaker if method == "GET" else None
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(f"Appwrite {what}: circuito abierto (Appwrite no disponible)")
+
+    with _stats_lock:
+        _stats["requests"] += 1
+
+    started = time.monotonic()
+    r = None
+    recorded = False
+    try:
+        r = _perform(method, url, timeout, hedge and method == "GET", kwargs)
+    except requests.RequestException as e:
+        left = deadline.remaining()
+        if isinstance(e, requests.Timeout) and left is not None and left <= MIN_CALL_BUDGET:
+            # corto por nuestro presupuesto, no necesariamente por Appwrite
+            raise _deadline_exceeded(what) from e
+        if breaker is not None:
+            breaker.record(False)
+            recorded = True
+        with _stats_lock:
+            _stats["errors"] += 1
+        raise AppwriteError(f"Appwrite {what}: {e}") from e
+    finally:
+        # cualquier otra salida (presupuesto, ValueError, ...) no cuenta como exito
+        # ni falla, pero tiene que liberar el turno de prueba del half_open
+        if breaker is not None and r is None and not recorded:
+            breaker.abandon()
+
+    elapsed = time.monotonic() - started
+    if breaker is not None:
+        # 4xx es culpa del pedido, no de Appwrite: solo 429/5xx cuentan como falla
+        breaker.record(r.status_code < 500 and r.status_code != 429, elapsed)
+    if method == "GET" and op == "read" and r.status_code < 400:
+        with _stats_lock:
+            _latencies.append(elapsed)
+
+    if allow_404 and r.status_code == 404:
+        return None
+
+    if r.status_code >= 400:
+        with _stats_lock:
+            _stats["errors"] += 1
+        raise AppwriteError(f"Appwrite {what} error: {r.status_code} {r.text}", r.status_code, r.text)
+    return r
+
+
+# ---------- Documentos ----------
+
+def create_document(collection_id: str, data: dict, document_id: str = "unique()"):
+    payload = {"documentId": document_id, "data": data}
+    return _request(
+        "POST", _collection_base(collection_id), "write", f"create {collection_id}",
+        json=payload,
+    )
+
+
+def get_document(collection_id: str, document_id: str):
+    """
+    Trae un documento por id. Retorna None si no existe.
+    """
+    document_id = (document_id or "").strip()
+    if not document_id:
+        return None
+
+    return _reads.do(
+        ("get", collection_id, document_id),
+        lambda: _request(
+            "GET", f"{_collection_base(collection_id)}/{document_id}", "read", f"get {collection_id}",
+            allow_404=True, hedge=True,
+        ),
+        copy=lambda doc: dict(doc) if doc is not None else None,
+    )
+
+
+def update_document(collection_id: str, document_id: str, data: dict):
+    document_id = (document_id or "").strip()
+    if not document_id:
+        raise ValueError("document_id requerido")
+
+    return _request(
+        "PATCH", f"{_collection_base(collection_id)}/{document_id}", "write", f"update {collection_id}",
+        json={"data": data},
+    )
+
+
+def delete_document(collection_id: str, document_id: str):
+    document_id = (document_id or "").strip()
+    if not document_id:
+        raise ValueError("document_id requerido")
+
+    _request(
+        "DELETE", f"{_collection_base(collection_id)}/{document_id}", "write", f"delete {collection_id}",
+    )
+    return True
+
+
+def _copy_page(res):
+    if not isinstance(res, dict):
+        return res
+    res = dict(res)
+    if isinstance(res.get("documents"), list):
+        res["documents"] = list(res["documents"])
+    return res
+
+
+def list_documents(collection_id: str, queries=None, limit: int = 25, offset: int = 0):
+    """
+    Una pagina de documentos. limit/offset van como queries (Query.limit/offset):
+    Appwrite 1.x ignora los params sueltos ?limit=&offset=.
+    Lecturas identicas concurrentes se unen en una sola (single-flight).
+    """
+    queries = list(queries or []) + [Query.limit(limit)]
+    if offset:
+        queries.append(Query.offset(offset))
+
+    return _reads.do(
+        ("list", collection_id, tuple(queries)),
+        lambda: _request(
+            "GET", _collection_base(collection_id), "read", f"list {collection_id}",
+            params={"queries[]": queries}, hedge=True,
+        ),
+        copy=_copy_page,
+    )
+
+
+def list_all_documents(collection_id: str, queries=None, batch_size: int = 100, max_total: int | None = None):
+    """
+    Trae TODOS los documentos (single-flight por collection + queries: una rafaga
+    con el cache frio hace una sola lectura completa por worker).
+    """
+    key = ("list_all", collection_id, tuple(queries or []), batch_size, max_total)
+    return _reads.do(
+        key,
+        lambda: _list_all_documents(collection_id, queries, batch_size, max_total),
+        copy=list,
+    )
+
+
+def _list_all_documents(collection_id: str, queries=None, batch_size: int = 100, max_total: int | None = None):
+    """
+    Trae TODOS los documentos paginando con offset/limit.
+    Con la primera pagina ya sabemos el total, asi que el resto de offsets
+    se piden en paralelo (max APPWRITE_PAGE_CONCURRENCY a la vez) y se unen en orden.
+    max_total (opcional) corta por seguridad.
+    """
+    res = list_documents(collection_id, queries=queries, limit=batch_size, offset=0)
+    all_docs = list(res.get("documents", []) or [])
+    total = res.get("total", None)
+    cap = max_total if max_total is not None else float("inf")
+
+    if not all_docs or len(all_docs) >= cap:
+        return all_docs[:max_total]
+
+    # sin total no sabemos los offsets: seguimos secuencial
+    if total is None:
+        offset = len(all_docs)
+        while len(all_docs) < cap:
+            res = list_documents(collection_id, queries=queries, limit=batch_size, offset=offset)
+            docs = res.get("documents", []) or []
+            if not docs:
+                break
+            all_docs.extend(docs)
+            offset += len(docs)
+        return all_docs[:max_total]
+
+    end = int(min(int(total), cap))
+    offsets = list(range(len(all_docs), end, batch_size))
+    if not offsets:
+        return all_docs
+
+    def fetch(offset):
+        return list_documents(collection_id, queries=queries, limit=batch_size, offset=offset)
+
+    workers = min(max(1, config.APPWRITE_PAGE_CONCURRENCY), len(offsets))
+    if workers == 1:
+        pages = map(fetch, offsets)
+        for page in pages:
+            all_docs.extend(page.get("documents", []) or [])
+        return all_docs[:max_total]
+
+    # cada pagina corre con el contexto del request (presupuesto de services/deadline)
+    contexts = [contextvars.copy_context() for _ in offsets]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map respeta el orden de offsets
+        for page in pool.map(lambda ctx, offset: ctx.run(fetch, offset), contexts, offsets):
+            all_docs.extend(page.get("documents", []) or [])
+
+    return all_docs[:max_total]
+
+
+# ---------- Storage ----------
+
+def upload_file(bucket_id: str, filename: str, stream, mimetype: str, file_id: str = "unique()"):
+    url = f"{_base()}/storage/buckets/{bucket_id}/files"
+    files = {"file": (filename, stream, mimetype)}
+    return _request(
+        "POST", url, "upload", f"upload {bucket_id}",
+        files=files, data={"fileId": file_id},
+    )
+
+
+def download_file(bucket_id: str, file_id: str):
+    """
+    Bytes de un archivo del bucket: (contenido, content_type). None si no existe.
+    """
+    url = f"{_base()}/storage/buckets/{bucket_id}/files/{file_id}/download"
+    r = _send("GET", url, "read", f"download {bucket_id}/{file_id}", allow_404=True)
+    if r is None:
+        return None
+    return r.content, (r.headers.get("Content-Type") or "application/octet-stream")
+
+
+def delete_file(bucket_id: str, file_id: str) -> bool:
+    """
+    Borra un archivo del bucket. Retorna False si no existia.
+    """
+    url = f"{_base()}/storage/buckets/{bucket_id}/files/{file_id}"
+    return _send("DELETE", url, "write", f"delete {bucket_id}/{file_id}", allow_404=True) is not None
+
+
+# ---------- Estadisticas ----------
+
+def reads_available() -> bool:
+    """
+    False mientras el circuit breaker de lecturas no dejaria pasar una request.
+    """
+    return _read_breaker.available()
+
+
+def reads_degraded() -> bool:
+    """
+    True si el circuit breaker de lecturas no esta cerrado (Appwrite caido o en prueba).
+    """
+    return _read_breaker.state != CLOSED
+
+
+def gateway_stats() -> dict:
+    """
+    Contadores del gateway + reuso de conexiones del pool de urllib3
+    (requests_sent - connections_opened = requests que reusaron un socket).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    connections = 0
+    pooled_requests = 0
+    session = _session_state["session"]
+    if session is not None and _session_state["pid"] == os.getpid():
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+
+    stats["connections_opened"] = connections
+    stats["requests_sent"] = pooled_requests
+    stats["connections_reused"] = max(0, pooled_requests - connections)
+    stats["pool_size"] = config.APPWRITE_POOL_SIZE
+    stats["single_flight"] = _reads.stats()
+    stats["circuit_breaker"] = _read_breaker.stats()
+    delay = _hedge_delay()
+    stats["hedge_enabled"] = config.APPWRITE_HEDGE_ENABLED
+    stats["hedge_delay_ms"] = round(delay * 1000, 1) if delay is not None else None
+    return stats
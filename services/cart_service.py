@@ -1,73 +1,171 @@
-from flask import session
+import uuid
+
+from flask import session, g
+
+from services.cart_store import get_store
+from services.product_service import get_catalog
+
+CART_ID_KEY = "cart_id"  # la cookie solo guarda el id; el carrito vive en services/cart_store
+LEGACY_CART_KEY = "cart"  # carrito viejo completo en la cookie (se migra al leerlo)
+
+
+def _cart_id(create: bool = False) -> str:
+    cart_id = session.get(CART_ID_KEY) or ""
+    if not cart_id and create:
+        cart_id = uuid.uuid4().hex
+        session[CART_ID_KEY] = cart_id
+    return cart_id
+
+
+def _load_raw() -> dict:
+    """
+    Carrito crudo: { product_id: cantidad }.
+    """
+    legacy = session.pop(LEGACY_CART_KEY, None)
+    if isinstance(legacy, dict) and legacy:
+        raw = {pid: int(it.get("quantity") or 0) for pid, it in legacy.items() if isinstance(it, dict)}
+        _save_raw(raw)
+        return raw
+
+    cart_id = _cart_id()
+    if not cart_id:
+        return {}
+    return get_store().get(cart_id)
+
+
+def _save_raw(raw: dict):
+    raw = {pid: int(q) for pid, q in raw.items() if pid and int(q) > 0}
+    cart_id = _cart_id(create=bool(raw))
+    if cart_id:
+        get_store().set(cart_id, raw)
+
+    # memo del request invalido
+    g.pop("cart", None)
+    g.pop("cart_totals", None)
 
-CART_KEY = "cart"  # dict: {product_id: {product_id,name,unit_price,quantity,image_url}}
 
 def get_cart() -> dict:
-    cart = session.get(CART_KEY)
-    if not isinstance(cart, dict):
-        cart = {}
-        session[CART_KEY] = cart
+    """
+    Carrito enriquecido desde el catalogo (memo por request):
+    { product_id: {product_id, name, unit_price, quantity, image_url, available} }
+
+    Un producto que no esta en el catalogo (borrado, o catalogo vacio con Appwrite
+    caido) queda con available=False y precio 0: no suma al total y bloquea el checkout.
+    """
+    if "cart" in g:
+        return g.cart
+
+    raw = _load_raw()
+    catalog = get_catalog() if raw else None
+
+    cart = {}
+    for pid, qty in raw.items():
+        product = catalog.by_id.get(pid)
+        if product is None:
+            cart[pid] = {
+                "product_id": pid,
+                "name": "Producto no disponible",
+                "unit_price": 0.0,
+                "quantity": int(qty),
+                "image_url": "",
+                "available": False,
+            }
+            continue
+
+        unit_price = float(product.get("base_price") or 0)
+        cart[pid] = {
+            "product_id": pid,
+            "name": product.get("name", "Producto"),
+            "unit_price": unit_price,
+            "quantity": int(qty),
+            "image_url": product.get("image_url") or "",
+            "available": unit_price > 0,
+        }
+
+    g.cart = cart
     return cart
 
+
+def unavailable_items() -> list:
+    """
+    Items del carrito que no se pueden comprar (sin producto en el catalogo o sin precio).
+    """
+    return [item for item in get_cart().values() if not item.get("available")]
+
+
 def save_cart(cart: dict):
-    session[CART_KEY] = cart
-    session.modified = True
+    # acepta el formato enriquecido o { product_id: cantidad }
+    _save_raw({
+        pid: (item.get("quantity", 0) if isinstance(item, dict) else item)
+        for pid, item in cart.items()
+    })
+
 
 def clear_cart():
-    session[CART_KEY] = {}
-    session.modified = True
+    cart_id = _cart_id()
+    if cart_id:
+        get_store().delete(cart_id)
+    session.pop(LEGACY_CART_KEY, None)
+    g.pop("cart", None)
+    g.pop("cart_totals", None)
 
-def add_item(product_id: str, name: str, unit_price: float, image_url: str = "", qty: int = 1):
-    cart = get_cart()
-    if product_id not in cart:
-        cart[product_id] = {
-            "product_id": product_id,
-            "name": name,
-            "unit_price": float(unit_price),
-            "quantity": int(qty),
-            "image_url": image_url or ""
-        }
-    else:
-        cart[product_id]["quantity"] = int(cart[product_id]["quantity"]) + int(qty)
+
+def add_item(product_id: str, name: str = "", unit_price: float = 0, image_url: str = "", qty: int = 1):
+    # name / unit_price / image_url se ignoran: salen del catalogo al mostrar el carrito
+    raw = _load_raw()
+    raw[product_id] = int(raw.get(product_id, 0)) + int(qty)
 
     # evitar negativos/cero
-    if cart[product_id]["quantity"] <= 0:
-        cart.pop(product_id, None)
+    if raw[product_id] <= 0:
+        raw.pop(product_id, None)
+
+    _save_raw(raw)
 
-    save_cart(cart)
 
 def set_quantity(product_id: str, quantity: int):
-    cart = get_cart()
-    if product_id in cart:
+    raw = _load_raw()
+    if product_id in raw:
         q = int(quantity)
         if q <= 0:
-            cart.pop(product_id, None)
+            raw.pop(product_id, None)
         else:
-            cart[product_id]["quantity"] = q
-        save_cart(cart)
+            raw[product_id] = q
+        _save_raw(raw)
+
 
 def inc(product_id: str, delta: int = 1):
-    cart = get_cart()
-    if product_id in cart:
-        cart[product_id]["quantity"] = int(cart[product_id]["quantity"]) + int(delta)
-        if cart[product_id]["quantity"] <= 0:
-            cart.pop(product_id, None)
-        save_cart(cart)
+    raw = _load_raw()
+    if product_id in raw:
+        raw[product_id] = int(raw[product_id]) + int(delta)
+        if raw[product_id] <= 0:
+            raw.pop(product_id, None)
+        _save_raw(raw)
+
 
 def remove_item(product_id: str):
-    cart = get_cart()
-    cart.pop(product_id, None)
-    save_cart(cart)
+    raw = _load_raw()
+    if raw.pop(product_id, None) is not None:
+        _save_raw(raw)
+
 
 def totals():
+    """
+    Subtotal y cantidad de items. Se calcula una vez por request.
+    """
+    if "cart_totals" in g:
+        return g.cart_totals
+
     cart = get_cart()
     subtotal = 0.0
     items_count = 0
 
     for _, item in cart.items():
+        if not item.get("available"):
+            continue
         qty = int(item.get("quantity", 0))
         price = float(item.get("unit_price", 0))
         subtotal += price * qty
         items_count += qty
 
-    return {"subtotal": subtotal, "items_count": items_count}
+    g.cart_totals = {"subtotal": subtotal, "items_count": items_count}
+    return g.cart_totals
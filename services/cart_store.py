@@ -0,0 +1,131 @@
+# services/cart_store.py
+"""
+Backends del carrito en el servidor. La cookie de sesion solo guarda el cart_id;
+aca se guarda { product_id: cantidad }.
+
+- "memory": LRU en memoria del proceso (dev / un solo worker).
+- "sqlite": archivo en DATA_DIR, compartido por todos los workers de gunicorn.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+
+# Carritos sin tocar por mas de esto se borran (sqlite)
+CART_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+
+class MemoryCartStore:
+    def __init__(self, max_carts: int = 10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cart_id: str) -> dict:
+        with self._lock:
+            items = self._carts.get(cart_id)
+            if items is None:
+                return {}
+            self._carts.move_to_end(cart_id)
+            return dict(items)
+
+    def set(self, cart_id: str, items: dict):
+        with self._lock:
+            if not items:
+                self._carts.pop(cart_id, None)
+                return
+            self._carts[cart_id] = dict(items)
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def delete(self, cart_id: str):
+        self.set(cart_id, {})
+
+
+class SQLiteCartStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS carts (
+                cart_id TEXT PRIMARY KEY,
+                items TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts (updated_at)")
+        conn.commit()
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, cart_id: str) -> dict:
+        row = self._conn().execute("SELECT items FROM carts WHERE cart_id = ?", (cart_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set(self, cart_id: str, items: dict):
+        conn = self._conn()
+        with conn:
+            if not items:
+                conn.execute("DELETE FROM carts WHERE cart_id = ?", (cart_id,))
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO carts (cart_id, items, updated_at) VALUES (?, ?, ?)",
+                (cart_id, json.dumps(items), time.time()),
+            )
+
+    def delete(self, cart_id: str):
+        self.set(cart_id, {})
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM carts WHERE updated_at < ?", (time.time() - CART_MAX_AGE_SECONDS,))
+        return cur.rowcount
+
+
+_store_lock = threading.Lock()
+_store_state = {"store": None}
+
+
+def get_store():
+    """
+    Backend configurado en CART_BACKEND (memory | sqlite). Uno por proceso.
+    """
+    store = _store_state["store"]
+    if store is not None:
+        return store
+
+    with _store_lock:
+        if _store_state["store"] is None:
+            backend = (config.CART_BACKEND or "sqlite").strip().lower()
+            if backend == "memory":
+                _store_state["store"] = MemoryCartStore(max_carts=config.CART_MEMORY_MAX)
+            elif backend == "sqlite":
+                store = SQLiteCartStore(os.path.join(config.DATA_DIR, "carts.sqlite3"))
+                try:
+                    store.purge_expired()
+                except Exception as e:
+                    print("ERROR limpiando carritos viejos:", e)
+                _store_state["store"] = store
+            else:
+                raise RuntimeError(f"CART_BACKEND invalido: {backend}")
+        return _store_state["store"]
@@ -0,0 +1,134 @@
+# services/catalog_store.py
+"""
+Snapshot del catalogo compartido en disco entre workers (DATA_DIR/catalog_snapshot.bin).
+
+- Un worker nuevo (o reciclado por gunicorn) arranca leyendo el ultimo snapshot
+  bueno del archivo en vez de ir a Appwrite. Es un snapshot en disco, no memoria
+  compartida: cada worker lo lee entero y arma su propia copia de los productos.
+- Un solo worker a la vez refresca desde Appwrite: el que toma el lock
+  (flock no bloqueante sobre catalog_snapshot.lock). Los demas leen el archivo.
+- El archivo se reescribe atomicamente (tmp + fsync + rename): un lector nunca
+  ve un archivo a medio escribir.
+
+Formato: MAGIC | largo del header (uint32) | header JSON | payload JSON compacto.
+El header trae la version del bus de invalidacion con la que se leyo Appwrite:
+si el admin invalido despues, el archivo ya no sirve.
+"""
+import json
+import os
+import struct
+import time
+
+from config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin eleccion entre procesos, cada worker refresca
+    fcntl = None
+
+FILENAME = "catalog_snapshot.bin"
+LOCK_FILENAME = "catalog_snapshot.lock"
+MAGIC = b"LGCAT1\0\0"
+_HEADER_LEN = struct.Struct("<I")
+
+
+def _path(name: str) -> str:
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    return os.path.join(config.DATA_DIR, name)
+
+
+def write_snapshot(products, images_map, bus_version: int) -> dict:
+    """
+    Escribe el snapshot de forma atomica. Retorna el header escrito.
+    """
+    payload = json.dumps(
+        {"products": list(products), "images_map": dict(images_map)},
+        separators=(",", ":"), ensure_ascii=False,
+    ).encode("utf-8")
+    header = {
+        "written_at": time.time(),
+        "bus_version": bus_version,
+        "count": len(products),
+        "payload_len": len(payload),
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    path = _path(FILENAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+def file_mtime() -> float:
+    try:
+        return os.path.getmtime(os.path.join(config.DATA_DIR, FILENAME))
+    except OSError:
+        return 0.0
+
+
+def read_snapshot():
+    """
+    (header, products, images_map) leidos del archivo, o None si no existe / esta corrupto.
+    """
+    try:
+        with open(os.path.join(config.DATA_DIR, FILENAME), "rb") as f:
+            raw = f.read()
+        if raw[:len(MAGIC)] != MAGIC:
+            return None
+        pos = len(MAGIC)
+        (header_len,) = _HEADER_LEN.unpack_from(raw, pos)
+        pos += _HEADER_LEN.size
+        header = json.loads(raw[pos:pos + header_len])
+        pos += header_len
+        data = json.loads(raw[pos:pos + header["payload_len"]])
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        if not isinstance(e, FileNotFoundError):
+            print("ERROR leyendo snapshot del catalogo:", e)
+        return None
+
+    return header, data.get("products") or [], data.get("images_map") or {}
+
+
+class RefreshLock:
+    """
+    Lock entre procesos (flock sobre un archivo de DATA_DIR) para elegir un solo
+    refresher. Tambien lo usa services/replica para el sync. Uso:
+
+        lock = RefreshLock()
+        if lock.acquire(blocking=False):
+            try: ...
+            finally: lock.release()
+    """
+
+    def __init__(self, filename: str = LOCK_FILENAME):
+        self.filename = filename
+        self._fd = None
+
+    def acquire(self, blocking: bool = False, timeout: float = 0) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(_path(self.filename), os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return True
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,234 @@
+# services/checkout_outbox.py
+"""
+Outbox local y durable del checkout (SQLite en DATA_DIR).
+
+El pedido se guarda aca de forma sincrona y el cliente recibe su numero de
+pedido + link de WhatsApp al instante, aunque Appwrite este lento o caido.
+Un worker en segundo plano (un thread por proceso) lo escribe en Appwrite con
+order_service.submit_order, que es idempotente (ids fijos), reintentando con backoff.
+Los pedidos ya escritos ('done') se borran pasado OUTBOX_DONE_RETENTION.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import config
+from services.order_service import build_order, resolve_order_user, submit_order
+
+DB_FILENAME = "checkout_outbox.sqlite3"
+
+# Un "processing" mas viejo que esto se considera abandonado (worker muerto)
+STALE_CLAIM_SECONDS = 300
+# Cada cuanto (segundos) el worker borra los 'done' viejos
+PRUNE_INTERVAL = 3600
+
+_local = threading.local()
+_worker_lock = threading.Lock()
+_worker_state = {"pid": None, "thread": None}
+_wakeup = threading.Event()
+
+
+def _db_path() -> str:
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    return os.path.join(config.DATA_DIR, DB_FILENAME)
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    conn = sqlite3.connect(_db_path(), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL: el pedido tiene que sobrevivir a un corte apenas respondemos
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            order_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            last_error TEXT NOT NULL DEFAULT '',
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at)")
+    conn.commit()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def enqueue_order_from_cart(form: dict, session_user: dict | None = None) -> dict:
+    """
+    Registra el pedido en la outbox (durable) y retorna {order_id, wa_url} sin esperar a Appwrite.
+    """
+    order = build_order(form, session_user)
+
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO outbox (order_id, payload, created_at) VALUES (?, ?, ?)",
+            (order["order_id"], json.dumps(order), time.time()),
+        )
+
+    start_worker()
+    _wakeup.set()
+    return {"order_id": order["order_id"], "wa_url": order["wa_url"]}
+
+
+def _claim_next():
+    """
+    Toma un pedido pendiente (o abandonado). El UPDATE condicionado evita que
+    dos workers de gunicorn procesen el mismo.
+    """
+    conn = _conn()
+    now = time.time()
+    row = conn.execute(
+        """
+        SELECT order_id, payload, attempts FROM outbox
+        WHERE (status = 'pending' AND next_attempt_at <= ?)
+           OR (status = 'processing' AND claimed_at < ?)
+        ORDER BY created_at LIMIT 1
+        """,
+        (now, now - STALE_CLAIM_SECONDS),
+    ).fetchone()
+    if not row:
+        return None
+
+    with conn:
+        cur = conn.execute(
+            """
+            UPDATE outbox SET status = 'processing', claimed_at = ?
+            WHERE order_id = ? AND (status = 'pending' OR (status = 'processing' AND claimed_at < ?))
+            """,
+            (now, row[0], now - STALE_CLAIM_SECONDS),
+        )
+    if cur.rowcount != 1:
+        return None
+    return row[0], json.loads(row[1]), row[2]
+
+
+def _save_payload(order_id: str, order: dict):
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE outbox SET payload = ? WHERE order_id = ?", (json.dumps(order), order_id))
+
+
+def _mark_done(order_id: str):
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "UPDATE outbox SET status = 'done', claimed_at = NULL, last_error = '' WHERE order_id = ?",
+            (order_id,),
+        )
+
+
+def prune_done() -> int:
+    """
+    Borra los pedidos ya escritos en Appwrite con mas de OUTBOX_DONE_RETENTION segundos.
+    """
+    conn = _conn()
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM outbox WHERE status = 'done' AND created_at < ?",
+            (time.time() - config.OUTBOX_DONE_RETENTION,),
+        )
+    return cur.rowcount
+
+
+def _mark_retry(order_id: str, attempts: int, error: Exception):
+    attempts += 1
+    status = "failed" if attempts >= config.OUTBOX_MAX_ATTEMPTS else "pending"
+    delay = min(config.OUTBOX_MAX_BACKOFF, config.OUTBOX_RETRY_BASE * (2 ** (attempts - 1)))
+
+    conn = _conn()
+    with conn:
+        conn.execute(
+            """
+            UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, claimed_at = NULL, last_error = ?
+            WHERE order_id = ?
+            """,
+            (status, attempts, time.time() + delay, str(error)[:500], order_id),
+        )
+
+
+def process_one() -> bool:
+    """
+    Escribe en Appwrite el siguiente pedido pendiente. Retorna False si no habia nada.
+    """
+    claimed = _claim_next()
+    if not claimed:
+        return False
+
+    order_id, order, attempts = claimed
+    try:
+        # el usuario se resuelve una sola vez y queda guardado (crear usuario sin email no es idempotente)
+        if not order.get("user_id"):
+            order["user_id"] = resolve_order_user(order)
+            _save_payload(order_id, order)
+
+        submit_order(order, rollback=False)
+        _mark_done(order_id)
+    except Exception as e:
+        print(f"ERROR outbox pedido {order_id} (intento {attempts + 1}):", e)
+        _mark_retry(order_id, attempts, e)
+    return True
+
+
+def _run_worker():
+    last_prune = 0.0
+    while True:
+        try:
+            while process_one():
+                pass
+            if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                prune_done()
+                last_prune = time.monotonic()
+        except Exception as e:
+            print("ERROR outbox worker:", e)
+        _wakeup.wait(timeout=config.OUTBOX_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_worker():
+    """
+    Arranca el worker de la outbox en este proceso (una vez por pid, seguro despues de fork).
+    """
+    pid = os.getpid()
+    if _worker_state["pid"] == pid and _worker_state["thread"] and _worker_state["thread"].is_alive():
+        return
+
+    with _worker_lock:
+        if _worker_state["pid"] == pid and _worker_state["thread"] and _worker_state["thread"].is_alive():
+            return
+        thread = threading.Thread(target=_run_worker, name="checkout-outbox", daemon=True)
+        thread.start()
+        _worker_state.update({"pid": pid, "thread": thread})
+
+
+def outbox_stats() -> dict:
+    """
+    Backlog de la outbox: pedidos aun no escritos en Appwrite.
+    """
+    rows = _conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+    counts = dict(rows)
+    oldest = _conn().execute(
+        "SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'processing')"
+    ).fetchone()[0]
+
+    return {
+        "backlog": counts.get("pending", 0) + counts.get("processing", 0),
+        "pending": counts.get("pending", 0),
+        "processing": counts.get("processing", 0),
+        "failed": counts.get("failed", 0),
+        "done": counts.get("done", 0),
+        "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+    }
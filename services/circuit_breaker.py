@@ -0,0 +1,109 @@
+# services/circuit_breaker.py
+"""
+Circuit breaker (por proceso) para las lecturas a Appwrite.
+
+- closed: las llamadas pasan. N fallas seguidas (error de red, timeout, 5xx/429
+  o una respuesta mas lenta que slow_call) lo abren.
+- open: se falla rapido sin ir a la red durante reset_timeout segundos.
+- half_open: pasado ese tiempo se deja pasar UNA llamada de prueba; si sale bien
+  se cierra, si falla se vuelve a abrir.
+"""
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float, slow_call: float = 0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"opened": 0, "short_circuited": 0, "probes": 0, "slow_calls": 0}
+
+    def _try_half_open(self):
+        # llamar con _lock tomado
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probing = False
+
+    def _open(self):
+        # llamar con _lock tomado
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._stats["opened"] += 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._try_half_open()
+            return self._state
+
+    def available(self) -> bool:
+        """
+        True si una llamada pasaria ahora (sin tomar el turno de prueba).
+        """
+        with self._lock:
+            self._try_half_open()
+            return self._state == CLOSED or (self._state == HALF_OPEN and not self._probing)
+
+    def allow(self) -> bool:
+        """
+        Pedir permiso para una llamada. En half_open solo una a la vez (la prueba).
+        """
+        with self._lock:
+            self._try_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self._stats["probes"] += 1
+                return True
+            self._stats["short_circuited"] += 1
+            return False
+
+    def record(self, ok: bool, elapsed: float = 0.0):
+        """
+        Resultado de una llamada permitida por allow().
+        """
+        slow = bool(ok and self.slow_call and elapsed > self.slow_call)
+        with self._lock:
+            if slow:
+                self._stats["slow_calls"] += 1
+            if ok and not slow:
+                self._state = CLOSED
+                self._failures = 0
+                self._probing = False
+                return
+
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def abandon(self):
+        """
+        La llamada permitida se corto por algo ajeno a Appwrite (ej: se acabo el
+        presupuesto del request): no cuenta ni como exito ni como falla.
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._try_half_open()
+            stats = dict(self._stats)
+            stats["state"] = self._state
+            stats["consecutive_failures"] = self._failures
+            stats["open_seconds"] = round(time.monotonic() - self._opened_at, 1) if self._state != CLOSED else None
+        stats["failure_threshold"] = self.failure_threshold
+        stats["reset_timeout"] = self.reset_timeout
+        stats["slow_call"] = self.slow_call
+        return stats
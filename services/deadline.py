@@ -0,0 +1,88 @@
+# services/deadline.py
+"""
+Presupuesto de tiempo por request (deadline).
+
+Cada ruta declara cuanto puede tardar en total (@request_budget). El limite se
+guarda en un contextvar y el gateway de Appwrite lo consulta antes de cada
+llamada: el timeout de esa llamada es lo que queda del presupuesto, no un valor
+fijo. Asi una vista que encadena varias lecturas no puede sumar varios timeouts.
+
+Fuera de un request con presupuesto (threads de fondo, workers) remaining()
+es None y se usan los timeouts normales.
+"""
+import contextvars
+import threading
+import time
+from functools import wraps
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """
+    Se acabo el presupuesto de tiempo del request.
+    """
+
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "exceeded": 0}
+
+
+def remaining():
+    """
+    Segundos que quedan del presupuesto del request actual (puede ser <= 0), o None si no hay.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def cap(seconds: float) -> float:
+    """
+    min(seconds, lo que queda del presupuesto). Nunca negativo.
+    """
+    left = remaining()
+    if left is None:
+        return seconds
+    return max(0.0, min(seconds, left))
+
+
+def record_exceeded():
+    with _stats_lock:
+        _stats["exceeded"] += 1
+
+
+def request_budget(seconds: float):
+    """
+    Decorador de vistas: el request entero (y todas sus llamadas a Appwrite)
+    tiene `seconds` segundos. 0 o None = sin presupuesto.
+    Si ya hay un presupuesto mas corto activo, se respeta el mas corto.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not seconds:
+                return view(*args, **kwargs)
+
+            deadline = time.monotonic() + seconds
+            current = _deadline.get()
+            if current is not None:
+                deadline = min(deadline, current)
+
+            with _stats_lock:
+                _stats["requests"] += 1
+            token = _deadline.set(deadline)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _deadline.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def deadline_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,113 @@
+# services/fragment_cache.py
+"""
+Cache de HTML renderizado para las paginas de la tienda (por proceso).
+
+Se cachea solo el bloque `content` de la pagina (grilla, filtros, paginacion),
+con clave = version del catalogo + template + path + querystring. Lo que depende
+del usuario (navbar con login/admin, mensajes flash) vive en base.html, fuera del
+bloque, y se renderiza en cada request: anonimos y logueados comparten el fragmento.
+
+LRU acotado por cantidad (FRAGMENT_CACHE_MAX_ENTRIES) y por bytes (FRAGMENT_CACHE_MAX_BYTES).
+"""
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template, request
+from markupsafe import Markup
+
+from config import config
+from services.product_service import get_catalog
+
+_lock = threading.Lock()
+_fragments = OrderedDict()  # key -> Markup
+_state = {"version": None, "bytes": 0}
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "uncached": 0}
+
+
+def _render_block(template_name: str, block: str, context: dict) -> Markup:
+    """
+    Renderiza un solo bloque del template (sin el layout de base.html).
+    """
+    env = current_app.jinja_env
+    template = env.get_template(template_name)
+    context = dict(context)
+    current_app.update_template_context(context)
+    return Markup("".join(template.blocks[block](template.new_context(context))))
+
+
+def _get(key, version: str):
+    with _lock:
+        if _state["version"] != version:
+            # catalogo nuevo: todos los fragmentos anteriores quedaron viejos
+            _fragments.clear()
+            _state.update({"version": version, "bytes": 0})
+            _stats["misses"] += 1
+            return None
+
+        html = _fragments.get(key)
+        if html is None:
+            _stats["misses"] += 1
+            return None
+        _fragments.move_to_end(key)
+        _stats["hits"] += 1
+        return html
+
+
+def _put(key, version: str, html: Markup):
+    size = len(html)
+    with _lock:
+        if _state["version"] != version or size > config.FRAGMENT_CACHE_MAX_BYTES:
+            return
+        old = _fragments.pop(key, None)
+        if old is not None:
+            _state["bytes"] -= len(old)
+        _fragments[key] = html
+        _state["bytes"] += size
+
+        while _fragments and (
+            len(_fragments) > config.FRAGMENT_CACHE_MAX_ENTRIES
+            or _state["bytes"] > config.FRAGMENT_CACHE_MAX_BYTES
+        ):
+            _, evicted = _fragments.popitem(last=False)
+            _state["bytes"] -= len(evicted)
+            _stats["evictions"] += 1
+
+
+def render_cached_page(template_name: str, build_context, **page_context):
+    """
+    render_template con el bloque `content` cacheado.
+
+    - build_context(): arma el contexto pesado (productos, filtros, paginacion);
+      solo se llama si el fragmento no esta en cache.
+    - page_context: variables baratas que tambien usan otros bloques (ej: title).
+    """
+    version = get_catalog().version
+    if not version:
+        # catalogo vacio / Appwrite caido: no cachear
+        with _lock:
+            _stats["uncached"] += 1
+        return render_template(template_name, **page_context, **build_context())
+
+    key = (
+        template_name,
+        request.path,
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+    html = _get(key, version)
+    if html is None:
+        html = _render_block(template_name, "content", {**page_context, **build_context()})
+        _put(key, version, html)
+
+    return render_template(template_name, content_html=html, **page_context)
+
+
+def fragment_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_fragments)
+        stats["bytes"] = _state["bytes"]
+        stats["version"] = _state["version"]
+    stats["max_entries"] = config.FRAGMENT_CACHE_MAX_ENTRIES
+    stats["max_bytes"] = config.FRAGMENT_CACHE_MAX_BYTES
+    return stats
@@ -0,0 +1,125 @@
+# services/http_cache.py
+"""
+GET condicional (ETag) para las paginas publicas del catalogo.
+
+El ETag sale de la version del snapshot del catalogo (ya en memoria) + la release
+de templates/assets + el estado de sesion que cambia el HTML (usuario / rol).
+Si el navegador ya tiene esa version se responde 304 sin renderizar ni ir a Appwrite.
+
+Sin Last-Modified: el max($updatedAt) no avanza al borrar un producto, y un
+If-Modified-Since daria 304 con la pagina vieja. El ETag si cambia.
+"""
+import hashlib
+import os
+import threading
+from functools import wraps
+
+from flask import make_response, request, session
+
+from services.product_service import catalog_degraded, get_catalog
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Archivos que cambian el HTML sin cambiar el catalogo (deploy)
+RELEASE_PATHS = [
+    "templates",
+    os.path.join("static", "dist", "manifest.json"),
+    os.path.join("static", "img", "derived", "manifest.json"),
+]
+
+_lock = threading.Lock()
+_state = {"release": None}
+_stats = {}
+
+
+def _release() -> str:
+    """
+    Identificador del deploy: APP_RELEASE o hash de mtimes/tamaños de templates y manifests.
+    Se calcula una vez por proceso (un deploy reinicia los workers).
+    """
+    if _state["release"] is not None:
+        return _state["release"]
+
+    release = (os.getenv("APP_RELEASE") or "").strip()
+    if not release:
+        digest = hashlib.sha1()
+        for rel in RELEASE_PATHS:
+            path = os.path.join(BASE_DIR, rel)
+            paths = [path]
+            if os.path.isdir(path):
+                paths = sorted(
+                    os.path.join(dirpath, name)
+                    for dirpath, _, names in os.walk(path) for name in names
+                )
+            for p in paths:
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                digest.update(f"{p}|{st.st_mtime_ns}|{st.st_size}\n".encode("utf-8"))
+        release = digest.hexdigest()[:12]
+
+    _state["release"] = release
+    return release
+
+
+def _viewer() -> str:
+    user = session.get("user") or {}
+    if not user:
+        return "anon"
+    key = f"{user.get('id') or user.get('$id') or user.get('email') or ''}|{(user.get('role') or '').lower()}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+
+
+def _count(endpoint: str, key: str):
+    with _lock:
+        stats = _stats.setdefault(endpoint, {"requests": 0, "not_modified": 0, "rendered": 0, "uncacheable": 0})
+        stats["requests"] += 1
+        stats[key] += 1
+
+
+def conditional_catalog_page(view):
+    """
+    Decorador para vistas cuyo HTML depende solo del catalogo (+ usuario logueado).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        endpoint = request.endpoint or view.__name__
+
+        snapshot = get_catalog()
+        # mensajes flash pendientes, catalogo vacio o modo degradado (aviso en base.html): sin cache
+        if session.get("_flashes") or not snapshot.version or catalog_degraded():
+            _count(endpoint, "uncacheable")
+            return view(*args, **kwargs)
+
+        etag = f"{snapshot.version}-{_release()}-{_viewer()}"
+
+        if request.if_none_match and request.if_none_match.contains(etag):
+            _count(endpoint, "not_modified")
+            resp = make_response("", 304)
+        else:
+            _count(endpoint, "rendered")
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+
+        resp.set_etag(etag)
+        # el HTML depende de la sesion: cache solo en el navegador y siempre revalidado
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+        resp.vary.add("Cookie")
+        return resp
+
+    return wrapper
+
+
+def conditional_get_stats() -> dict:
+    with _lock:
+        per_endpoint = {k: dict(v) for k, v in _stats.items()}
+
+    total = {"requests": 0, "not_modified": 0, "rendered": 0, "uncacheable": 0}
+    for stats in per_endpoint.values():
+        for k in total:
+            total[k] += stats[k]
+    total["not_modified_ratio"] = round(total["not_modified"] / total["requests"], 3) if total["requests"] else 0.0
+    return {"total": total, "endpoints": per_endpoint, "release": _release()}
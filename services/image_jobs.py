@@ -0,0 +1,412 @@
+# services/image_jobs.py
+"""
+Cola local (SQLite en DATA_DIR) de imagenes subidas desde el admin.
+
+El request del admin solo guarda el archivo en disco y encola el trabajo;
+un pool de workers (IMAGE_WORKERS threads por proceso) lo procesa:
+orienta segun EXIF, borra metadata, achica a IMAGE_MASTER_MAX_SIDE, re-encodea,
+sube el master + thumbnails al bucket y linkea la imagen al producto.
+
+Ids fijos (job_id para el master y el documento product_images,
+"<job_id>-<ancho>" para los thumbnails): un reintento no duplica nada.
+"""
+import io
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import config
+from services.product_images_service import (
+    delete_bucket_files,
+    link_product_image,
+    thumbnail_file_id,
+    upload_bytes_to_bucket,
+)
+
+DB_FILENAME = "image_jobs.sqlite3"
+UPLOADS_DIRNAME = "uploads"
+
+# Un "processing" mas viejo que esto se considera abandonado (worker muerto)
+STALE_CLAIM_SECONDS = 600
+RETRY_BASE_SECONDS = 10
+POLL_INTERVAL = 5
+STATUS_CHUNK = 500
+PRUNE_INTERVAL = 3600
+
+_local = threading.local()
+_worker_lock = threading.Lock()
+_worker_state = {"pid": None, "threads": []}
+_wakeup = threading.Event()
+_prune_state = {"last_prune": 0.0}
+
+
+def _uploads_dir() -> str:
+    path = os.path.join(config.DATA_DIR, UPLOADS_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(config.DATA_DIR, DB_FILENAME), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            job_id TEXT PRIMARY KEY,
+            product_id TEXT NOT NULL,
+            filename TEXT NOT NULL DEFAULT '',
+            mimetype TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            last_error TEXT NOT NULL DEFAULT '',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status, next_attempt_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_product ON image_jobs (product_id, created_at)")
+    conn.commit()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _upload_path(job_id: str) -> str:
+    return os.path.join(_uploads_dir(), job_id)
+
+
+def enqueue_product_image(product_id: str, file_storage) -> str:
+    """
+    Guarda el archivo subido en disco y encola su procesamiento. Retorna el job_id.
+    """
+    product_id = (product_id or "").strip()
+    if not product_id:
+        raise ValueError("product_id es requerido")
+
+    # "img" + hex: valido como fileId/documentId de Appwrite y deja lugar al sufijo de thumbnails
+    job_id = "img" + uuid.uuid4().hex[:24]
+    path = _upload_path(job_id)
+    tmp = path + ".tmp"
+    file_storage.save(tmp)
+    os.replace(tmp, path)
+
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO image_jobs (job_id, product_id, filename, mimetype, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, product_id, file_storage.filename or "", file_storage.mimetype or "", now, now),
+        )
+
+    start_workers()
+    _wakeup.set()
+    return job_id
+
+
+def cancel_product_jobs(product_id: str) -> int:
+    """
+    Descarta los trabajos no terminados de un producto (ej: se elimino antes de terminar).
+    Un trabajo en 'processing' ve que su fila ya no existe: no enlaza la imagen y
+    borra del bucket lo que ya habia subido.
+    """
+    conn = _conn()
+    rows = conn.execute(
+        "SELECT job_id FROM image_jobs WHERE product_id = ? AND status IN ('pending', 'processing', 'failed')",
+        (product_id,),
+    ).fetchall()
+    with conn:
+        conn.execute(
+            "DELETE FROM image_jobs WHERE product_id = ? AND status IN ('pending', 'processing', 'failed')",
+            (product_id,),
+        )
+    for (job_id,) in rows:
+        _remove_upload(job_id)
+    return len(rows)
+
+
+def retry_product_jobs(product_id: str) -> int:
+    """
+    Vuelve a encolar los trabajos fallidos de un producto.
+    """
+    conn = _conn()
+    with conn:
+        cur = conn.execute(
+            """
+            UPDATE image_jobs SET status = 'pending', attempts = 0, next_attempt_at = 0, updated_at = ?
+            WHERE product_id = ? AND status = 'failed'
+            """,
+            (time.time(), product_id),
+        )
+    if cur.rowcount:
+        start_workers()
+        _wakeup.set()
+    return cur.rowcount
+
+
+def prune_done() -> int:
+    """
+    Borra los trabajos terminados con mas de IMAGE_JOBS_DONE_RETENTION segundos.
+    """
+    conn = _conn()
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM image_jobs WHERE status = 'done' AND updated_at < ?",
+            (time.time() - config.IMAGE_JOBS_DONE_RETENTION,),
+        )
+    return cur.rowcount
+
+
+def _remove_upload(job_id: str):
+    try:
+        os.remove(_upload_path(job_id))
+    except OSError:
+        pass
+
+
+def _discard_uploaded(job_id: str, outputs):
+    """
+    El trabajo se cancelo mientras subiamos: borrar del bucket lo que ya se subio
+    (ids fijos; los que no llegaron a subirse dan 404 y se ignoran).
+    """
+    try:
+        delete_bucket_files([file_id for file_id, _, _, _ in outputs])
+    except Exception as e:
+        print(f"ERROR borrando archivos de la imagen cancelada {job_id}:", e)
+
+
+# ---------- Procesamiento ----------
+
+def _encode(im, max_side: int):
+    """
+    Copia achicada (si hace falta) y re-encodeada sin metadata. Retorna (bytes, mimetype, ext).
+    """
+    from PIL import Image
+
+    im = im.copy()
+    im.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if im.mode == "RGBA":
+        im.save(out, "WEBP", quality=config.IMAGE_QUALITY, method=6)
+        return out.getvalue(), "image/webp", "webp"
+
+    # sin exif= ni icc_profile=: Pillow no copia la metadata del original
+    im.convert("RGB").save(out, "JPEG", quality=config.IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue(), "image/jpeg", "jpg"
+
+
+def _process_image(job_id: str):
+    """
+    Retorna [(file_id, filename, bytes, mimetype)]: master + thumbnails.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(_upload_path(job_id)) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+
+        outputs = []
+        data, mimetype, ext = _encode(im, config.IMAGE_MASTER_MAX_SIDE)
+        outputs.append((job_id, f"{job_id}.{ext}", data, mimetype))
+
+        for width in config.IMAGE_THUMB_WIDTHS:
+            if width >= max(im.size):
+                continue
+            data, mimetype, ext = _encode(im, width)
+            thumb_id = thumbnail_file_id(job_id, width)
+            outputs.append((thumb_id, f"{thumb_id}.{ext}", data, mimetype))
+    return outputs
+
+
+def _is_bad_image(e: Exception) -> bool:
+    """
+    El archivo no es una imagen que Pillow pueda abrir (o es una bomba de descompresion):
+    reintentar no sirve.
+    """
+    try:
+        from PIL import Image, UnidentifiedImageError
+    except ImportError:
+        return False
+    return isinstance(e, (UnidentifiedImageError, Image.DecompressionBombError))
+
+
+def _claim_next():
+    conn = _conn()
+    now = time.time()
+    row = conn.execute(
+        """
+        SELECT job_id, product_id, attempts, filename, mimetype FROM image_jobs
+        WHERE (status = 'pending' AND next_attempt_at <= ?)
+           OR (status = 'processing' AND claimed_at < ?)
+        ORDER BY created_at LIMIT 1
+        """,
+        (now, now - STALE_CLAIM_SECONDS),
+    ).fetchone()
+    if not row:
+        return None
+
+    with conn:
+        cur = conn.execute(
+            """
+            UPDATE image_jobs SET status = 'processing', claimed_at = ?, updated_at = ?
+            WHERE job_id = ? AND (status = 'pending' OR (status = 'processing' AND claimed_at < ?))
+            """,
+            (now, now, row[0], now - STALE_CLAIM_SECONDS),
+        )
+    if cur.rowcount != 1:
+        return None
+    return row
+
+
+def _job_exists(job_id: str) -> bool:
+    return _conn().execute("SELECT 1 FROM image_jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+
+def _finish(job_id: str, status: str, attempts: int, error: str = "", delay: float = 0):
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.execute(
+            """
+            UPDATE image_jobs SET status = ?, attempts = ?, next_attempt_at = ?, claimed_at = NULL,
+                last_error = ?, updated_at = ?
+            WHERE job_id = ?
+            """,
+            (status, attempts, now + delay, error[:500], now, job_id),
+        )
+
+
+def process_one() -> bool:
+    """
+    Procesa el siguiente trabajo pendiente. Retorna False si no habia nada.
+    """
+    claimed = _claim_next()
+    if not claimed:
+        return False
+
+    job_id, product_id, attempts, filename, mimetype = claimed
+    try:
+        try:
+            outputs = _process_image(job_id)
+        except ImportError:
+            # sin Pillow no se publica el original (EXIF/GPS, sin resize): queda
+            # fallido con el archivo guardado, para reintentar desde el admin
+            print(f"ERROR procesando imagen {job_id}: Pillow no esta instalado")
+            _finish(job_id, "failed", attempts, "Pillow no esta instalado: la imagen no se optimizo")
+            return True
+        except Exception as e:
+            if not _is_bad_image(e):
+                raise
+            print(f"ERROR procesando imagen {job_id}: archivo invalido:", e)
+            _finish(job_id, "failed", attempts + 1, f"imagen invalida: {e}")
+            return True
+
+        for file_id, filename, data, mimetype in outputs:
+            # el producto se borro mientras procesabamos (cancel_product_jobs): no seguir subiendo
+            if not _job_exists(job_id):
+                break
+            upload_bytes_to_bucket(file_id, filename, data, mimetype)
+
+        # cancelado: no enlazar y borrar del bucket lo que se haya subido (en este u otro intento)
+        if not _job_exists(job_id):
+            _discard_uploaded(job_id, outputs)
+            _remove_upload(job_id)
+            return True
+        link_product_image(product_id, job_id, document_id=job_id)
+
+        _finish(job_id, "done", attempts + 1)
+        _remove_upload(job_id)
+    except Exception as e:
+        attempts += 1
+        print(f"ERROR procesando imagen {job_id} (intento {attempts}):", e)
+        if isinstance(e, OSError) and not os.path.exists(_upload_path(job_id)):
+            _finish(job_id, "failed", attempts, "archivo subido no encontrado")
+        elif attempts >= config.IMAGE_MAX_ATTEMPTS:
+            _finish(job_id, "failed", attempts, str(e))
+        else:
+            _finish(job_id, "pending", attempts, str(e), delay=RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+    return True
+
+
+def _run_worker():
+    while True:
+        try:
+            while process_one():
+                pass
+            if time.monotonic() - _prune_state["last_prune"] >= PRUNE_INTERVAL:
+                _prune_state["last_prune"] = time.monotonic()
+                prune_done()
+        except Exception as e:
+            print("ERROR image worker:", e)
+        _wakeup.wait(timeout=POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers():
+    """
+    Arranca el pool de workers de imagenes en este proceso (una vez por pid, seguro despues de fork).
+    """
+    pid = os.getpid()
+    with _worker_lock:
+        threads = _worker_state["threads"] if _worker_state["pid"] == pid else []
+        threads = [t for t in threads if t.is_alive()]
+        for i in range(len(threads), max(1, config.IMAGE_WORKERS)):
+            thread = threading.Thread(target=_run_worker, name=f"image-worker-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        _worker_state.update({"pid": pid, "threads": threads})
+
+
+# ---------- Estado ----------
+
+def product_image_status(product_ids) -> dict:
+    """
+    Ultimo trabajo de imagen de cada producto pedido: { product_id: {status, attempts, last_error, job_id} }.
+    Solo lee las filas de esos productos (indice por product_id).
+    """
+    product_ids = sorted({pid for pid in product_ids or [] if pid})
+    conn = _conn()
+    status = {}
+    # de a STATUS_CHUNK ids: SQLite limita la cantidad de parametros por consulta
+    for i in range(0, len(product_ids), STATUS_CHUNK):
+        chunk = product_ids[i:i + STATUS_CHUNK]
+        rows = conn.execute(
+            f"""
+            SELECT product_id, job_id, status, attempts, last_error FROM image_jobs
+            WHERE product_id IN ({", ".join("?" for _ in chunk)})
+            ORDER BY created_at
+            """,
+            chunk,
+        ).fetchall()
+        for product_id, job_id, st, attempts, last_error in rows:
+            status[product_id] = {"job_id": job_id, "status": st, "attempts": attempts, "last_error": last_error}
+    return status
+
+
+def image_jobs_stats() -> dict:
+    rows = _conn().execute("SELECT status, COUNT(*) FROM image_jobs GROUP BY status").fetchall()
+    counts = dict(rows)
+    return {
+        "pending": counts.get("pending", 0),
+        "processing": counts.get("processing", 0),
+        "failed": counts.get("failed", 0),
+        "done": counts.get("done", 0),
+        "workers": len([t for t in _worker_state["threads"] if t.is_alive()])
+        if _worker_state["pid"] == os.getpid() else 0,
+    }
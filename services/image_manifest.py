@@ -0,0 +1,98 @@
+# services/image_manifest.py
+"""
+Lee el manifest de derivados responsive (generado por tools/build_images.py)
+y arma srcset para los templates. Si el manifest no existe, no pasa nada:
+los templates siguen usando la imagen original.
+"""
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(BASE_DIR, "static", "img", "derived", "manifest.json")
+
+# Cada cuanto (segundos) se revisa si el manifest cambio en disco
+CHECK_INTERVAL = 10
+
+# sizes para las cards del grid (1 / 2 / 3 columnas, ver .grid en styles.css)
+CARD_IMAGE_SIZES = "(min-width: 960px) 33vw, (min-width: 640px) 50vw, 100vw"
+DETAIL_IMAGE_SIZES = "(min-width: 960px) 50vw, 100vw"
+
+# orden de preferencia en <picture>
+MIME_TYPES = [("avif", "image/avif"), ("webp", "image/webp")]
+
+_lock = threading.Lock()
+_state = {"manifest": {}, "mtime": None, "checked_at": 0.0}
+
+
+def _manifest() -> dict:
+    now = time.monotonic()
+    if now - _state["checked_at"] < CHECK_INTERVAL:
+        return _state["manifest"]
+
+    with _lock:
+        if now - _state["checked_at"] < CHECK_INTERVAL:
+            return _state["manifest"]
+        _state["checked_at"] = now
+        try:
+            mtime = os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            _state.update({"manifest": {}, "mtime": None})
+            return _state["manifest"]
+
+        if mtime != _state["mtime"]:
+            try:
+                with open(MANIFEST_PATH, encoding="utf-8") as f:
+                    _state.update({"manifest": json.load(f), "mtime": mtime})
+            except (OSError, ValueError) as e:
+                print("ERROR leyendo manifest de imagenes:", e)
+        return _state["manifest"]
+
+
+def _entry(url: str):
+    url = (url or "").strip()
+    if not url.startswith("/static/"):
+        return None
+    return _manifest().get(url[len("/static/"):].split("?", 1)[0])
+
+
+def image_srcset(url: str, fmt: str = "webp") -> str:
+    """
+    "/static/img/derived/x-320.<hash>.webp 320w, ..." o "" si la imagen no tiene derivados.
+    """
+    entry = _entry(url)
+    if not entry:
+        return ""
+    variants = (entry.get("variants") or {}).get(fmt) or []
+    return ", ".join(f"/static/{rel} {w}w" for w, rel in variants)
+
+
+def _proxy_srcset(url: str) -> str:
+    """
+    srcset de una imagen servida por el proxy /img/<file_id> (services/image_proxy).
+    """
+    from config import config
+
+    file_id = url[len("/img/"):].split("?", 1)[0]
+    if not file_id or "/" in file_id:
+        return ""
+    return ", ".join(f"/img/{file_id}?w={w} {w}w" for w in config.IMAGE_PROXY_WIDTHS)
+
+
+def image_sources(url: str):
+    """
+    [(mime, srcset)] para los <source> de un <picture>, del formato mas liviano al mas pesado.
+    Para el proxy /img/ el formato lo decide el servidor (mime vacio).
+    """
+    url = (url or "").strip()
+    if url.startswith("/img/"):
+        srcset = _proxy_srcset(url)
+        return [("", srcset)] if srcset else []
+
+    sources = []
+    for fmt, mime in MIME_TYPES:
+        srcset = image_srcset(url, fmt)
+        if srcset:
+            sources.append((mime, srcset))
+    return sources
@@ -0,0 +1,335 @@
+# services/image_proxy.py
+"""
+Proxy de imagenes del bucket de Appwrite con cache en disco (DATA_DIR/img_cache).
+
+- Cada (file_id, ancho) se baja de Appwrite una sola vez, se achica y queda en disco.
+- Los anchos se redondean hacia arriba a IMAGE_PROXY_WIDTHS (cantidad de variantes acotada).
+- LRU por tamaño total (IMAGE_CACHE_MAX_BYTES): se borran los archivos usados hace mas tiempo.
+- Misses concurrentes del mismo archivo/ancho esperan a una sola descarga (y
+  reciben su mismo resultado o error).
+
+Los archivos de Appwrite no cambian de contenido (un archivo nuevo = un file_id nuevo),
+asi que las respuestas se sirven como immutable.
+"""
+import io
+import os
+import re
+import threading
+import time
+
+from config import config
+from services.appwrite_gateway import download_file
+from services.product_images_service import has_thumbnails, thumbnail_file_id
+
+CACHE_DIRNAME = "img_cache"
+
+# ids validos de Appwrite (evita paths raros en disco)
+FILE_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,35}$")
+
+# Tocar el mtime (orden del LRU) como maximo cada tanto por archivo
+TOUCH_INTERVAL = 300
+# Al pasarse del maximo se borra hasta quedar en este porcentaje
+EVICT_TARGET = 0.9
+# (file_id, ancho) sin thumbnail en el bucket que se recuerdan por proceso
+THUMB_MISSES_MAX = 10000
+
+_lock = threading.Lock()
+# un solo thread por proceso recorre y borra el cache (sin tomar _lock)
+_evict_lock = threading.Lock()
+_inflight = {}  # key -> _Flight
+_thumb_misses = set()
+_state = {"pid": None, "total_bytes": None}
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+
+
+def _cache_dir() -> str:
+    path = os.path.join(config.DATA_DIR, CACHE_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def valid_file_id(file_id: str) -> bool:
+    return bool(FILE_ID_RE.match(file_id or ""))
+
+
+def snap_width(width) -> int:
+    """
+    Ancho pedido -> ancho de variante permitido mas cercano hacia arriba. 0 = original.
+    """
+    try:
+        width = int(width or 0)
+    except (TypeError, ValueError):
+        return 0
+    if width <= 0:
+        return 0
+    for w in config.IMAGE_PROXY_WIDTHS:
+        if width <= w:
+            return w
+    return config.IMAGE_PROXY_WIDTHS[-1]
+
+
+def etag_for(file_id: str, width: int) -> str:
+    return f"{file_id}-w{width}"
+
+
+def _variant_path(file_id: str, width: int):
+    """
+    Path del variant en disco si existe: img_cache/<file_id>/<ancho>.<ext>.
+    """
+    folder = os.path.join(_cache_dir(), file_id)
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return None
+    prefix = f"{width}."
+    for name in names:
+        # solo tipos de imagen conocidos (un .bin de antes no se sirve)
+        if name.startswith(prefix) and name[len(prefix):] in MIME_BY_EXT:
+            return os.path.join(folder, name)
+    return None
+
+
+def _touch(path: str):
+    try:
+        if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+            os.utime(path, None)
+    except OSError:
+        pass
+
+
+# ---------- Descarga + resize ----------
+
+EXT_BY_MIME = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/avif": "avif",
+    "image/gif": "gif",
+}
+
+MIME_BY_EXT = {ext: mime for mime, ext in EXT_BY_MIME.items()}
+
+
+def mimetype_for(path: str) -> str:
+    return MIME_BY_EXT.get(path.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+def _fetch_source(file_id: str, width: int):
+    """
+    Bytes originales desde Appwrite. Si hay thumbnail de ese ancho (services/image_jobs) se usa ese.
+    Solo se prueba el thumbnail si el archivo lo puede tener y no se sabe ya que falta
+    (asi las imagenes viejas no pagan un 404 extra por variant).
+    """
+    bucket_id = (config.APPWRITE_BUCKET_PRODUCT_IMAGES or "").strip()
+    key = (file_id, width)
+    if width and width in config.IMAGE_THUMB_WIDTHS and has_thumbnails(file_id) and key not in _thumb_misses:
+        res = download_file(bucket_id, thumbnail_file_id(file_id, width))
+        if res:
+            return res
+        with _lock:
+            if len(_thumb_misses) >= THUMB_MISSES_MAX:
+                _thumb_misses.clear()
+            _thumb_misses.add(key)
+    return download_file(bucket_id, file_id)
+
+
+def _resize(data: bytes, width: int):
+    """
+    (bytes, mimetype) del variant. Sin Pillow (o imagen ilegible) retorna None y se sirve el original.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            if im.width <= width:
+                return None
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+            height = round(im.height * width / im.width)
+            im = im.resize((width, height), Image.LANCZOS)
+
+            out = io.BytesIO()
+            im.save(out, "WEBP", quality=config.IMAGE_QUALITY, method=4)
+            return out.getvalue(), "image/webp"
+    except Exception as e:
+        print("ERROR achicando imagen:", e)
+        return None
+
+
+def _store(file_id: str, width: int, data: bytes, mimetype: str) -> str:
+    folder = os.path.join(_cache_dir(), file_id)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{width}.{EXT_BY_MIME[mimetype]}")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    with _lock:
+        if _state["total_bytes"] is not None and _state["pid"] == os.getpid():
+            _state["total_bytes"] += len(data)
+    _evict_if_needed()
+    return path
+
+
+def _build_variant(file_id: str, width: int):
+    res = _fetch_source(file_id, width)
+    if res is None:
+        return None
+    data, mimetype = res
+    mimetype = (mimetype or "").split(";")[0].strip().lower()
+    if mimetype not in EXT_BY_MIME:
+        # no es una imagen que sepamos servir: ni se cachea ni se sirve como octet-stream
+        raise RuntimeError(f"tipo de archivo no soportado para /img: {mimetype or 'desconocido'}")
+
+    if width:
+        resized = _resize(data, width)
+        if resized:
+            data, mimetype = resized
+    return _store(file_id, width, data, mimetype)
+
+
+# ---------- LRU ----------
+
+def _scan():
+    """
+    [(mtime, size, path)] de todos los variants en disco.
+    """
+    files = []
+    root = _cache_dir()
+    for folder in os.listdir(root):
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in os.listdir(folder_path):
+            path = os.path.join(folder_path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    return files
+
+
+def _evict_if_needed():
+    """
+    El total se lleva en memoria por proceso; al pasarse del maximo se recalcula
+    desde disco (otros workers tambien escriben) y se borran los mas viejos.
+    El recorrido y los borrados van sin _lock (no frenan hits ni misses); si otro
+    thread ya esta limpiando, no se espera.
+    """
+    pid = os.getpid()
+    with _lock:
+        known = _state["pid"] == pid and _state["total_bytes"] is not None
+        if known and _state["total_bytes"] <= config.IMAGE_CACHE_MAX_BYTES:
+            return
+
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        files = _scan()
+        total = sum(size for _, size, _ in files)
+        if total > config.IMAGE_CACHE_MAX_BYTES:
+            target = config.IMAGE_CACHE_MAX_BYTES * EVICT_TARGET
+            evicted = 0
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    evicted += 1
+                except OSError:
+                    pass
+                try:
+                    os.rmdir(os.path.dirname(path))  # solo si quedo vacia
+                except OSError:
+                    pass
+            with _lock:
+                _stats["evictions"] += evicted
+
+        with _lock:
+            _state["pid"] = pid
+            _state["total_bytes"] = total
+    finally:
+        _evict_lock.release()
+
+
+# ---------- API ----------
+
+class _Flight:
+    """
+    Descarga en curso de un (file_id, ancho): los que llegan despues esperan su resultado.
+    """
+    __slots__ = ("event", "path", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.path = None
+        self.error = None
+
+
+def get_image(file_id: str, width: int = 0):
+    """
+    Path en disco del variant (file_id, ancho), bajandolo de Appwrite si hace falta.
+    Retorna None si el archivo no existe en el bucket. Si la descarga falla (tambien
+    para los que esperaban la misma descarga) levanta la excepcion.
+    """
+    width = snap_width(width)
+    path = _variant_path(file_id, width)
+    if path:
+        with _lock:
+            _stats["hits"] += 1
+        _touch(path)
+        return path
+
+    key = (file_id, width)
+    with _lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _inflight[key] = flight
+            _stats["misses"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        if not flight.event.wait(timeout=config.APPWRITE_TIMEOUT_READ * 2):
+            raise TimeoutError(f"imagen {file_id} (w={width}): la descarga en curso no termino")
+        if flight.error is not None:
+            raise flight.error
+        return flight.path
+
+    try:
+        flight.path = _build_variant(file_id, width)
+        return flight.path
+    except Exception as e:
+        flight.error = e
+        with _lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        flight.event.set()
+
+
+def proxy_url(file_id: str, width: int = 0) -> str:
+    file_id = (file_id or "").strip()
+    if not file_id:
+        return ""
+    width = snap_width(width)
+    return f"/img/{file_id}?w={width}" if width else f"/img/{file_id}"
+
+
+def image_proxy_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["cache_bytes"] = _state["total_bytes"] if _state["pid"] == os.getpid() else None
+    stats["max_bytes"] = config.IMAGE_CACHE_MAX_BYTES
+    return stats
@@ -0,0 +1,95 @@
+# services/invalidation_bus.py
+"""
+Bus de invalidacion entre workers de gunicorn, sin servicios externos.
+
+Un contador de 8 bytes en un archivo de DATA_DIR, mapeado en memoria (mmap) por
+cada proceso. Las mutaciones del admin lo incrementan (bump) y cada worker lo lee
+en cada request (current): es una lectura de memoria, sin syscalls ni red.
+Si cambio respecto al ultimo valor visto, el worker descarta su cache.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos (dev con un solo proceso)
+    fcntl = None
+
+FILENAME = "catalog_version.bin"
+_FORMAT = "<Q"
+_SIZE = struct.calcsize(_FORMAT)
+
+_lock = threading.Lock()
+_state = {"pid": None, "fd": None, "map": None, "error": False}
+
+
+def _mapping():
+    """
+    mmap del contador (uno por proceso; se reabre despues de fork). None si no se pudo abrir.
+    """
+    pid = os.getpid()
+    if _state["pid"] == pid:
+        return _state["map"]
+
+    with _lock:
+        if _state["pid"] == pid:
+            return _state["map"]
+        fd = None
+        try:
+            os.makedirs(config.DATA_DIR, exist_ok=True)
+            fd = os.open(os.path.join(config.DATA_DIR, FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(fd).st_size < _SIZE:
+                os.ftruncate(fd, _SIZE)  # rellena con ceros (version 0)
+            mapping = mmap.mmap(fd, _SIZE)
+            _state.update({"pid": pid, "fd": fd, "map": mapping, "error": False})
+        except OSError as e:
+            print("ERROR abriendo bus de invalidacion:", e)
+            if fd is not None:
+                os.close(fd)
+            _state.update({"pid": pid, "fd": None, "map": None, "error": True})
+        return _state["map"]
+
+
+def current() -> int:
+    """
+    Version actual del catalogo compartida entre workers (0 si el bus no esta disponible).
+    """
+    mapping = _mapping()
+    if mapping is None:
+        return 0
+    return struct.unpack_from(_FORMAT, mapping, 0)[0]
+
+
+def bump() -> int:
+    """
+    Incrementa la version (lock exclusivo del archivo: dos admins a la vez no pisan el valor).
+    Retorna la version nueva.
+    """
+    mapping = _mapping()
+    if mapping is None:
+        return 0
+
+    with _lock:
+        fd = _state["fd"]
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            version = struct.unpack_from(_FORMAT, mapping, 0)[0] + 1
+            struct.pack_into(_FORMAT, mapping, 0, version)
+            mapping.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    return version
+
+
+def bus_stats() -> dict:
+    return {
+        "version": current(),
+        "available": not _state["error"],
+        "path": os.path.join(config.DATA_DIR, FILENAME),
+    }
@@ -0,0 +1,229 @@
+# services/order_items_index.py
+"""
+Indice local persistente order_id -> order_items (SQLite en DATA_DIR).
+
+- create_order_from_cart agrega los items apenas se escriben en Appwrite.
+- sync() trae solo lo nuevo por $createdAt (watermark) para cubrir items
+  escritos por otros workers / procesos. Corre en un thread de fondo (nunca
+  dentro de un request), con backoff si Appwrite falla.
+- Hasta que la primera carga completa termina, get_items() no responde y
+  order_service usa la query filtrada.
+- Lookup por order_id con indice: no depende del tamaño del historial.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from appwrite.query import Query
+
+from config import config
+from models.constants import TABLE_ORDER_ITEMS
+from services.appwrite_gateway import list_all_documents
+from services.catalog_store import RefreshLock
+
+DB_FILENAME = "order_items_index.sqlite3"
+LOCK_FILENAME = "order_items_sync.lock"
+
+# Espera maxima (segundos) entre reintentos despues de fallas seguidas
+MAX_BACKOFF = 600
+
+_local = threading.local()
+_worker_lock = threading.Lock()
+_worker_state = {"pid": None, "thread": None}
+_sync_state = {"last_sync": 0.0, "last_attempt": 0.0, "failures": 0}
+
+
+def _db_path() -> str:
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    return os.path.join(config.DATA_DIR, DB_FILENAME)
+
+
+def _conn() -> sqlite3.Connection:
+    """
+    Una conexion por thread (sqlite3 no comparte conexiones entre threads).
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    conn = sqlite3.connect(_db_path(), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_items (
+            doc_id TEXT PRIMARY KEY,
+            order_id TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT '',
+            data TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id, created_at)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.commit()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _get_meta(conn, key: str, default: str = "") -> str:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def add_items(docs):
+    """
+    Upsert de documentos order_items (por $id). Idempotente.
+    """
+    rows = []
+    for d in docs or []:
+        doc_id = (d.get("$id") or "").strip()
+        order_id = (d.get("order_id") or "").strip()
+        if doc_id and order_id:
+            rows.append((doc_id, order_id, d.get("$createdAt") or "", json.dumps(d)))
+
+    if not rows:
+        return 0
+
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO order_items (doc_id, order_id, created_at, data) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
+
+def remove_items(doc_ids) -> int:
+    """
+    Saca items del indice (ej: borrados por el rollback de un checkout).
+    """
+    doc_ids = [d for d in doc_ids or [] if d]
+    if not doc_ids:
+        return 0
+    conn = _conn()
+    with conn:
+        conn.executemany("DELETE FROM order_items WHERE doc_id = ?", [(d,) for d in doc_ids])
+    return len(doc_ids)
+
+
+def remove_order(order_id: str) -> int:
+    """
+    Saca todos los items de un pedido del indice.
+    """
+    conn = _conn()
+    with conn:
+        cur = conn.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
+    return cur.rowcount
+
+
+def loaded() -> bool:
+    """
+    True si la primera carga completa ya termino (en cualquier worker).
+    """
+    return _get_meta(_conn(), "loaded") == "1"
+
+
+def sync() -> int:
+    """
+    Trae de Appwrite los order_items con $createdAt >= watermark (o todo si es la primera vez)
+    y avanza el watermark. Retorna cuantos documentos llegaron.
+    """
+    conn = _conn()
+    watermark = _get_meta(conn, "watermark")
+
+    queries = [Query.order_asc("$createdAt")]
+    if watermark:
+        # >= para no perder items con el mismo timestamp; el upsert deduplica
+        queries.insert(0, Query.greater_than_equal("$createdAt", watermark))
+
+    docs = list_all_documents(TABLE_ORDER_ITEMS, queries=queries, batch_size=100)
+    add_items(docs)
+
+    newest = max((d.get("$createdAt") or "" for d in docs), default="")
+    with conn:
+        if newest and newest > watermark:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (newest,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('loaded', '1')")
+
+    _sync_state["last_sync"] = time.monotonic()
+    return len(docs)
+
+
+def _sync_elected():
+    """
+    Una pasada de sync (solo el worker que tiene el lock; los demas leen el mismo archivo).
+    Si falla, la proxima espera crece (backoff) hasta MAX_BACKOFF.
+    """
+    lock = RefreshLock(LOCK_FILENAME)
+    if not lock.acquire(blocking=False):
+        return
+    _sync_state["last_attempt"] = time.monotonic()
+    try:
+        sync()
+        _sync_state["failures"] = 0
+    except Exception as e:
+        _sync_state["failures"] += 1
+        print(f"ERROR sync order_items (falla {_sync_state['failures']}):", e)
+    finally:
+        lock.release()
+
+
+def _next_delay() -> float:
+    failures = _sync_state["failures"]
+    if not failures:
+        return config.ORDER_ITEMS_SYNC_INTERVAL
+    return min(MAX_BACKOFF, config.ORDER_ITEMS_SYNC_INTERVAL * (2 ** (failures - 1)))
+
+
+def _run_worker():
+    while True:
+        _sync_elected()
+        time.sleep(_next_delay())
+
+
+def start_sync():
+    """
+    Arranca el thread de sync en este proceso (una vez por pid, seguro despues de fork).
+    """
+    pid = os.getpid()
+    with _worker_lock:
+        thread = _worker_state["thread"]
+        if _worker_state["pid"] == pid and thread and thread.is_alive():
+            return
+        thread = threading.Thread(target=_run_worker, name="order-items-sync", daemon=True)
+        thread.start()
+        _worker_state.update({"pid": pid, "thread": thread})
+
+
+def get_items(order_id: str):
+    """
+    Items de un pedido desde el indice local, ordenados por $createdAt.
+    Vacio si la primera carga todavia no termino (el caller usa la query filtrada).
+    """
+    order_id = (order_id or "").strip()
+    if not order_id or not loaded():
+        return []
+
+    rows = _conn().execute(
+        "SELECT data FROM order_items WHERE order_id = ? ORDER BY created_at, doc_id",
+        (order_id,),
+    ).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def index_stats() -> dict:
+    conn = _conn()
+    count = conn.execute("SELECT COUNT(*) FROM order_items").fetchone()[0]
+    return {
+        "items": count,
+        "loaded": _get_meta(conn, "loaded") == "1",
+        "watermark": _get_meta(conn, "watermark"),
+        "consecutive_failures": _sync_state["failures"],
+        "seconds_since_sync": round(time.monotonic() - _sync_state["last_sync"], 1)
+        if _sync_state["last_sync"] else None,
+    }
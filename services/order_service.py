@@ -1,108 +1,36 @@
 # services/order_service.py
-import requests
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
 from urllib.parse import quote
+from appwrite.query import Query
 from config import config
 from models.constants import TABLE_USERS, TABLE_ORDERS, TABLE_ORDER_ITEMS
 from services.cart_service import get_cart, totals
+from services.product_service import get_image_urls
+from services import order_items_index, replica
+from services.appwrite_gateway import (
+    AppwriteError,
+    create_document,
+    get_document,
+    update_document,
+    delete_document,
+    list_documents,
+    list_all_documents,
+)
 
 WHATSAPP_NUMBER = "573160438565"  # 57 + numero negocio
 
 
-def _headers():
-    return {
-        "X-Appwrite-Project": config.APPWRITE_PROJECT_ID,
-        "X-Appwrite-Key": config.APPWRITE_API_KEY,
-        "Content-Type": "application/json",
-    }
-
-
-def _base():
-    return (config.APPWRITE_ENDPOINT or "").rstrip("/")
-
-
-def _collection_base(collection_id: str) -> str:
-    return f"{_base()}/databases/{config.APPWRITE_DATABASE_ID}/collections/{collection_id}/documents"
-
-
-def _create_document(collection_id: str, data: dict):
-    url = _collection_base(collection_id)
-    payload = {"documentId": "unique()", "data": data}
-
-    r = requests.post(url, headers=_headers(), json=payload, timeout=20)
-    if r.status_code >= 400:
-        raise RuntimeError(f"Appwrite create error {collection_id}: {r.status_code} {r.text}")
-    return r.json()
-
-
-def _update_document(collection_id: str, document_id: str, data: dict):
-    document_id = (document_id or "").strip()
-    if not document_id:
-        raise ValueError("document_id requerido")
-
-    url = f"{_collection_base(collection_id)}/{document_id}"
-    payload = {"data": data}
-
-    r = requests.patch(url, headers=_headers(), json=payload, timeout=20)
-    if r.status_code >= 400:
-        raise RuntimeError(f"Appwrite update error {collection_id}: {r.status_code} {r.text}")
-    return r.json()
-
-
-def _list_documents(collection_id: str, queries=None, limit=25, offset=0):
-    url = _collection_base(collection_id)
-    params = {"limit": limit, "offset": offset}
-
-    # IMPORTANTE: queries[] a veces en ciertos entornos da syntax error.
-    # Hoy lo evitamos en order_items con filtro local.
-    if queries:
-        params["queries[]"] = queries
-
-    r = requests.get(url, headers=_headers(), params=params, timeout=20)
-    if r.status_code >= 400:
-        raise RuntimeError(f"Appwrite list error {collection_id}: {r.status_code} {r.text}")
-    return r.json()
-
-
-def _list_all_documents(collection_id: str, batch_size: int = 100, max_total: int = 2000):
-    """
-    Trae documentos paginando con offset/limit.
-    max_total evita que se vuelva infinito si algo raro pasa.
-    """
-    all_docs = []
-    offset = 0
-
-    while True:
-        res = _list_documents(collection_id, queries=None, limit=batch_size, offset=offset)
-        docs = res.get("documents", []) or []
-        total = res.get("total", None)
-
-        all_docs.extend(docs)
-        offset += len(docs)
-
-        # corte por seguridad
-        if len(all_docs) >= max_total:
-            break
-
-        # si no hay mas docs, paramos
-        if not docs:
-            break
-
-        # si Appwrite nos da total, usamos ese
-        if total is not None and offset >= int(total):
-            break
-
-    return all_docs
-
-
 def _find_user_by_email(email: str):
     email = (email or "").strip().lower()
     if not email:
         return None
 
-    # Si esto te falla por queries en algun momento, hacemos el mismo truco:
-    # traemos users y filtramos local. Por ahora lo dejo con query.
-    q = [f'equal("email", ["{email}"])']
-    res = _list_documents(TABLE_USERS, queries=q, limit=1, offset=0)
+    # Query del SDK (el formato string viejo equal("email", [...]) da syntax error
+    # en Appwrite 1.x)
+    q = [Query.equal("email", email)]
+    res = list_documents(TABLE_USERS, queries=q, limit=1, offset=0)
     docs = res.get("documents", []) or []
     return docs[0] if docs else None
 
@@ -111,7 +39,7 @@ def _get_or_create_user(full_name: str, phone: str, email: str, city: str, addre
     email = (email or "").strip().lower()
 
     if not email:
-        return _create_document(TABLE_USERS, {
+        return create_document(TABLE_USERS, {
             "full_name": full_name,
             "phone": phone,
             "email": "",
@@ -122,7 +50,7 @@ def _get_or_create_user(full_name: str, phone: str, email: str, city: str, addre
 
     existing = _find_user_by_email(email)
     if existing:
-        return _update_document(TABLE_USERS, existing.get("$id"), {
+        return update_document(TABLE_USERS, existing.get("$id"), {
             "full_name": full_name or existing.get("full_name") or "",
             "phone": phone or existing.get("phone") or "",
             "city": city or existing.get("city") or "",
@@ -130,7 +58,7 @@ def _get_or_create_user(full_name: str, phone: str, email: str, city: str, addre
             "role": existing.get("role") or "buyer",
         })
 
-    return _create_document(TABLE_USERS, {
+    return create_document(TABLE_USERS, {
         "full_name": full_name,
         "phone": phone,
         "email": email,
@@ -140,12 +68,131 @@ def _get_or_create_user(full_name: str, phone: str, email: str, city: str, addre
     })
 
 
-def create_order_from_cart(form: dict, session_user: dict | None = None):
+def _delete_quietly(collection_id: str, document_id: str):
+    try:
+        delete_document(collection_id, document_id)
+        return True
+    except Exception as e:
+        print(f"ERROR rollback {collection_id} {document_id}:", e)
+        return False
+
+
+def _rollback_order(order_id: str, item_docs):
+    """
+    Compensacion de un checkout a medias: borra los items ya escritos y el pedido.
+    Si el pedido no se puede borrar, queda marcado como cancelado.
+    """
+    for d in item_docs:
+        _delete_quietly(TABLE_ORDER_ITEMS, d.get("$id"))
+
+    # el sync de fondo pudo haberlos indexado mientras tanto
+    try:
+        order_items_index.remove_order(order_id)
+    except Exception as e:
+        print("ERROR indice order_items:", e)
+
+    if not _delete_quietly(TABLE_ORDERS, order_id):
+        try:
+            update_document(TABLE_ORDERS, order_id, {"status": "cancelado"})
+        except Exception as e:
+            print(f"ERROR marcando pedido {order_id} como cancelado:", e)
+
+
+def _delete_late_item(future):
+    # item que termino de escribirse DESPUES del rollback: tambien se borra
+    if future.cancelled() or future.exception() is not None:
+        return
+    doc_id = (future.result() or {}).get("$id")
+    _delete_quietly(TABLE_ORDER_ITEMS, doc_id)
+    try:
+        order_items_index.remove_items([doc_id])
+    except Exception as e:
+        print("ERROR indice order_items:", e)
+
+
+def _create_or_get(collection_id: str, data: dict, document_id: str):
+    """
+    Crea un documento con id fijo. Si ya existe (409, ej: un reintento), retorna el existente.
+    Asi escribir un pedido dos veces no lo duplica.
+    """
+    try:
+        return create_document(collection_id, data, document_id=document_id)
+    except AppwriteError as e:
+        if e.status_code == 409:
+            doc = get_document(collection_id, document_id)
+            if doc:
+                return doc
+        raise
+
+
+def _create_order_items(order_id: str, payloads, deadline: float, rollback: bool = True):
+    """
+    Escribe los order_items en paralelo (max CHECKOUT_WRITE_CONCURRENCY) dentro del
+    deadline del checkout. Ids fijos "<order_id>-NN" (idempotente ante reintentos).
+    Si alguno falla o se acaba el tiempo, hace rollback del pedido completo
+    (salvo rollback=False) y lanza RuntimeError. Retorna los docs en el orden del carrito.
+    """
+    if not payloads:
+        return []
+
+    workers = min(max(1, config.CHECKOUT_WRITE_CONCURRENCY), len(payloads))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {
+        pool.submit(_create_or_get, TABLE_ORDER_ITEMS, p, f"{order_id}-{i:02d}"): i
+        for i, p in enumerate(payloads)
+    }
+
+    created = {}
+    error = None
+    try:
+        for f in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            try:
+                created[futures[f]] = f.result()
+            except Exception as e:
+                error = e
+                break
+    except FutureTimeout:
+        error = TimeoutError("Appwrite no respondio a tiempo")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if error is not None:
+        if rollback:
+            for f in futures:
+                if not f.done():
+                    f.add_done_callback(_delete_late_item)
+                elif futures[f] not in created and not f.cancelled() and f.exception() is None:
+                    created[futures[f]] = f.result()
+
+            _rollback_order(order_id, list(created.values()))
+        raise RuntimeError(f"No se pudo registrar el pedido: {error}") from error
+
+    return [created[i] for i in range(len(payloads))]
+
+
+def new_order_id() -> str:
+    """
+    Id local del pedido; es tambien el $id del documento en Appwrite
+    (max 36 chars, alfanumerico).
+    """
+    return "lg" + uuid.uuid4().hex[:20]
+
+
+def build_order(form: dict, session_user: dict | None = None, order_id: str = "") -> dict:
+    """
+    Arma el pedido completo desde el carrito (sin tocar Appwrite):
+    datos del cliente, payloads de order_items y link de WhatsApp.
+    """
     cart = get_cart()
     if not cart or len(cart) == 0:
         raise ValueError("Carrito vacio")
 
+    # nunca registrar lineas sin producto o en $0 (producto borrado / catalogo caido)
+    if any(not item.get("available") or float(item.get("unit_price") or 0) <= 0 for item in cart.values()):
+        raise ValueError("Hay productos no disponibles en el carrito")
+
     t = totals()
+    order_id = order_id or new_order_id()
 
     full_name = (form.get("full_name") or "").strip()
     phone = (form.get("phone") or "").strip()
@@ -159,30 +206,14 @@ def create_order_from_cart(form: dict, session_user: dict | None = None):
     if session_user and session_user.get("id"):
         user_id = session_user.get("id")
 
-    if not user_id:
-        user_doc = _get_or_create_user(full_name, phone, email, city, address)
-        user_id = user_doc.get("$id")
-
-    # 1) Crear order
-    order_doc = _create_document(TABLE_ORDERS, {
-        "user_id": user_id,
-        "full_name": full_name,
-        "phone": phone,
-        "email": email,
-        "city": city,
-        "address": address,
-        "notes": notes,
-        "status": "nuevo",
-    })
-    order_id = order_doc.get("$id")
-
-    # 2) Crear order_items (con TODOS los required de tu tabla)
+    # order_items (con TODOS los required de tu tabla)
+    items = []
     for _, item in cart.items():
         qty = int(item.get("quantity") or 1)
         unit_price = float(item.get("unit_price") or 0)
         subtotal = unit_price * qty
 
-        item_payload = {
+        items.append({
             "order_id": order_id,  # required
             "product_id": str(item.get("product_id") or ""),  # required
             "variant_id": str(item.get("variant_id") or ""),  # opcional en DB (puede ir vacio)
@@ -191,11 +222,9 @@ def create_order_from_cart(form: dict, session_user: dict | None = None):
             "unit_price": unit_price,  # required
             "quantity": qty,  # required
             "subtotal": subtotal,  # required
-        }
-
-        _create_document(TABLE_ORDER_ITEMS, item_payload)
+        })
 
-    # 3) WhatsApp link
+    # WhatsApp link
     msg_lines = [
         "Hola! Quiero confirmar este pedido en Lamin Gold:",
         f"Pedido: {order_id}",
@@ -207,11 +236,8 @@ def create_order_from_cart(form: dict, session_user: dict | None = None):
         "Items:"
     ]
 
-    for _, item in cart.items():
-        qty = int(item.get("quantity") or 1)
-        unit_price = float(item.get("unit_price") or 0)
-        line_total = unit_price * qty
-        msg_lines.append(f"- {item.get('name','Producto')} x{qty} = $ {int(line_total)}")
+    for it in items:
+        msg_lines.append(f"- {it['product_name_snapshot']} x{it['quantity']} = $ {int(it['subtotal'])}")
 
     msg_lines += ["", f"Total: $ {int(t['subtotal'])}"]
 
@@ -221,34 +247,138 @@ def create_order_from_cart(form: dict, session_user: dict | None = None):
     text = quote("\n".join(msg_lines))
     wa_url = f"https://wa.me/{WHATSAPP_NUMBER}?text={text}"
 
-    return {"order_id": order_id, "wa_url": wa_url}
+    return {
+        "order_id": order_id,
+        "user_id": user_id,
+        "customer": {
+            "full_name": full_name,
+            "phone": phone,
+            "email": email,
+            "city": city,
+            "address": address,
+            "notes": notes,
+        },
+        "items": items,
+        "wa_url": wa_url,
+    }
+
+
+def resolve_order_user(order: dict) -> str:
+    """
+    user_id del pedido: el de la sesion, o busca/crea el usuario por email.
+    """
+    if order.get("user_id"):
+        return order["user_id"]
+
+    c = order["customer"]
+    user_doc = _get_or_create_user(c["full_name"], c["phone"], c["email"], c["city"], c["address"])
+    return user_doc.get("$id")
+
+
+def submit_order(order: dict, deadline: float | None = None, rollback: bool = True) -> str:
+    """
+    Escribe en Appwrite un pedido armado con build_order: usuario, order y order_items.
+    Idempotente (ids fijos), asi que se puede reintentar. Retorna el order_id.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + config.CHECKOUT_DEADLINE
+
+    order_id = order["order_id"]
+    user_id = resolve_order_user(order)
+    c = order["customer"]
+
+    # 1) Crear order
+    order_doc = _create_or_get(TABLE_ORDERS, {
+        "user_id": user_id,
+        "full_name": c["full_name"],
+        "phone": c["phone"],
+        "email": c["email"],
+        "city": c["city"],
+        "address": c["address"],
+        "notes": c["notes"],
+        "status": "nuevo",
+    }, order_id)
+
+    # 2) Crear order_items, en paralelo
+    created_items = _create_order_items(order_id, order["items"], deadline, rollback=rollback)
+
+    # indice local order_id -> items (si falla, el sync por $createdAt lo recupera)
+    try:
+        order_items_index.add_items(created_items)
+    except Exception as e:
+        print("ERROR indice order_items:", e)
+
+    replica.write_through(TABLE_ORDERS, order_doc)
+    for item in created_items:
+        replica.write_through(TABLE_ORDER_ITEMS, item)
+
+    return order_id
+
+
+def create_order_from_cart(form: dict, session_user: dict | None = None):
+    """
+    Checkout sincrono: arma y escribe el pedido en Appwrite antes de responder.
+    (El checkout web usa la outbox: services/checkout_outbox.py)
+    """
+    deadline = time.monotonic() + config.CHECKOUT_DEADLINE
+    order = build_order(form, session_user)
+    order_id = submit_order(order, deadline)
+    return {"order_id": order_id, "wa_url": order["wa_url"]}
 
 
 def list_orders(limit: int = 50):
+    if replica.ready(TABLE_ORDERS):
+        return replica.find(TABLE_ORDERS, desc=True, limit=limit)
+
     try:
-        q = ['orderDesc("$createdAt")']
-        res = _list_documents(TABLE_ORDERS, queries=q, limit=limit, offset=0)
+        q = [Query.order_desc("$createdAt")]
+        res = list_documents(TABLE_ORDERS, queries=q, limit=limit, offset=0)
         return res.get("documents", []) or []
     except Exception:
-        res = _list_documents(TABLE_ORDERS, queries=None, limit=limit, offset=0)
+        res = list_documents(TABLE_ORDERS, queries=None, limit=limit, offset=0)
         return res.get("documents", []) or []
 
 
+def _scan_order_items(order_id: str):
+    """
+    Fallback viejo: traemos order_items y filtramos en Python por order_id.
+    """
+    docs = list_all_documents(TABLE_ORDER_ITEMS, batch_size=100, max_total=2000)
+    return [d for d in docs if (d.get("order_id") or "").strip() == order_id]
+
+
 def get_order_items(order_id: str, limit: int = 200):
     """
-    FIX MVP: NO usamos queries de Appwrite (porque te esta tirando Syntax error).
-    Traemos order_items y filtramos en Python por order_id.
+    Items de UN pedido. Primero desde el indice local (order_items_index);
+    si no hay nada ahi, query filtrada (Query.equal del SDK), y si Appwrite
+    rechaza la query, scan completo + filtro local.
     """
     order_id = (order_id or "").strip()
     if not order_id:
         return []
 
-    docs = _list_all_documents(TABLE_ORDER_ITEMS, batch_size=100, max_total=2000)
+    if replica.ready(TABLE_ORDER_ITEMS):
+        items = replica.find(TABLE_ORDER_ITEMS, {"order_id": order_id}, limit=limit)
+        if items:
+            return items
 
-    items = []
-    for d in docs:
-        if (d.get("order_id") or "").strip() == order_id:
-            items.append(d)
+    try:
+        items = order_items_index.get_items(order_id)
+        if items:
+            return items[:limit]
+    except Exception as e:
+        print("ERROR indice order_items:", e)
+
+    try:
+        # sin max_total: se trae el pedido completo y se corta despues de ordenar
+        items = list_all_documents(
+            TABLE_ORDER_ITEMS,
+            queries=[Query.equal("order_id", order_id)],
+            batch_size=100,
+        )
+    except Exception as e:
+        print("ERROR query order_items (usando scan):", e)
+        items = _scan_order_items(order_id)
 
     # orden opcional por createdAt (si existe)
     try:
@@ -260,6 +390,39 @@ def get_order_items(order_id: str, limit: int = 200):
     return items[:limit]
 
 
+def get_order_detail(order_id: str):
+    """
+    Todo lo que necesita el detalle de pedido del admin, en pocas llamadas:
+    1) el pedido por id, 2) sus items con una query filtrada,
+    3) las imagenes de todos los productos en un solo batch (desde el catalogo en cache).
+    Retorna None si el pedido no existe.
+    """
+    order_id = (order_id or "").strip()
+    if not order_id:
+        return None
+
+    order = replica.get(TABLE_ORDERS, order_id) if replica.ready(TABLE_ORDERS) else None
+    if not order:
+        order = get_document(TABLE_ORDERS, order_id)
+    if not order:
+        return None
+
+    items = get_order_items(order_id)
+
+    product_ids = [(it.get("product_id") or "").strip() for it in items]
+    images = get_image_urls(product_ids)
+
+    total = 0
+    for it, pid in zip(items, product_ids):
+        try:
+            total += float(it.get("subtotal") or 0)
+        except (TypeError, ValueError):
+            pass
+        it["image_url"] = images.get(pid, "") if pid else ""
+
+    return {"order": order, "items": items, "total": int(total)}
+
+
 def update_order_status(order_id: str, status: str):
     order_id = (order_id or "").strip()
     status = (status or "").strip().lower()
@@ -268,4 +431,6 @@ def update_order_status(order_id: str, status: str):
     if status not in allowed:
         raise ValueError("Estado no permitido.")
 
-    return _update_document(TABLE_ORDERS, order_id, {"status": status})
+    doc = update_document(TABLE_ORDERS, order_id, {"status": status})
+    replica.write_through(TABLE_ORDERS, doc)
+    return doc
@@ -1,77 +1,92 @@
 # services/product_images_service.py
-import requests
+import re
+
 from config import config
 from models.constants import TABLE_PRODUCT_IMAGES
+from services import replica
+from services.appwrite_gateway import AppwriteError, create_document, delete_file, get_document, upload_file
 
 
-def _headers_json():
-    return {
-        "X-Appwrite-Project": config.APPWRITE_PROJECT_ID,
-        "X-Appwrite-Key": config.APPWRITE_API_KEY,
-        "Content-Type": "application/json",
-    }
-
-
-def _headers_file():
-    return {
-        "X-Appwrite-Project": config.APPWRITE_PROJECT_ID,
-        "X-Appwrite-Key": config.APPWRITE_API_KEY,
-    }
-
+def thumbnail_file_id(file_id: str, width: int) -> str:
+    """
+    Id del thumbnail de un master subido por services/image_jobs ("<file_id>-<ancho>").
+    """
+    return f"{file_id}-{int(width)}"
 
-def _base():
-    return (config.APPWRITE_ENDPOINT or "").strip().rstrip("/")
 
+# ids de los masters subidos por services/image_jobs ("img" + 24 hex); los
+# archivos anteriores (ids de Appwrite) no tienen thumbnails
+JOB_FILE_ID_RE = re.compile(r"^img[0-9a-f]{24}$")
 
-def _collection_base(collection_id: str) -> str:
-    return f"{_base()}/databases/{config.APPWRITE_DATABASE_ID}/collections/{collection_id}/documents"
 
+def has_thumbnails(file_id: str) -> bool:
+    """
+    True si el archivo fue subido por services/image_jobs (puede tener thumbnails).
+    """
+    return bool(JOB_FILE_ID_RE.match(file_id or ""))
 
-def _storage_upload_url(bucket_id: str) -> str:
-    return f"{_base()}/storage/buckets/{bucket_id}/files"
 
-
-def upload_file_to_bucket(file_storage) -> str:
+def _bucket_id() -> str:
     bucket_id = (config.APPWRITE_BUCKET_PRODUCT_IMAGES or "").strip()
     if not bucket_id:
         raise RuntimeError("Falta APPWRITE_BUCKET_PRODUCT_IMAGES en .env")
+    return bucket_id
 
-    url = _storage_upload_url(bucket_id)
 
-    files = {
-        "file": (file_storage.filename, file_storage.stream, file_storage.mimetype)
-    }
-    data = {"fileId": "unique()"}
+def upload_file_to_bucket(file_storage) -> str:
+    bucket_id = _bucket_id()
 
-    r = requests.post(url, headers=_headers_file(), files=files, data=data, timeout=60)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
+    res = upload_file(bucket_id, file_storage.filename, file_storage.stream, file_storage.mimetype)
 
-    file_id = (r.json().get("$id") or "").strip()
+    file_id = (res.get("$id") or "").strip()
     if not file_id:
         raise RuntimeError("No se recibio file_id al subir la imagen.")
     return file_id
 
 
-def link_product_image(product_id: str, file_id: str):
+def upload_bytes_to_bucket(file_id: str, filename: str, data: bytes, mimetype: str) -> str:
+    """
+    Sube con id fijo. Si el archivo ya existe (409, ej: un reintento) se da por subido.
+    """
+    try:
+        upload_file(_bucket_id(), filename, data, mimetype, file_id=file_id)
+    except AppwriteError as e:
+        if e.status_code != 409:
+            raise
+    return file_id
+
+
+def delete_bucket_files(file_ids) -> int:
+    """
+    Borra archivos del bucket (los que no existen se ignoran). Retorna cuantos se borraron.
+    """
+    bucket_id = _bucket_id()
+    return sum(1 for file_id in file_ids if file_id and delete_file(bucket_id, file_id))
+
+
+def link_product_image(product_id: str, file_id: str, document_id: str = "unique()"):
     product_id = (product_id or "").strip()
     file_id = (file_id or "").strip()
     if not product_id or not file_id:
         raise ValueError("product_id y file_id son requeridos")
 
-    url = _collection_base(TABLE_PRODUCT_IMAGES)
-    payload = {
-        "documentId": "unique()",
-        "data": {
+    try:
+        doc = create_document(TABLE_PRODUCT_IMAGES, {
             "product_id": product_id,
             "file_id": file_id
-        }
-    }
-
-    r = requests.post(url, headers=_headers_json(), json=payload, timeout=25)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
-    return r.json()
+        }, document_id=document_id)
+    except AppwriteError as e:
+        # id fijo ya creado (reintento): usar el existente
+        doc = get_document(TABLE_PRODUCT_IMAGES, document_id) if e.status_code == 409 else None
+        if not doc:
+            raise
+
+    replica.write_through(TABLE_PRODUCT_IMAGES, doc)
+
+    # el producto ya tiene imagen: el catalogo en cache quedo viejo
+    from services.product_service import invalidate_catalog_cache
+    invalidate_catalog_cache()
+    return doc
 
 
 def upload_and_link_product_image(product_id: str, file_storage):
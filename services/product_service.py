@@ -1,13 +1,37 @@
-import requests
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+from appwrite.query import Query
 from config import config
+from services.appwrite_gateway import (
+    create_document,
+    delete_document,
+    get_document,
+    list_all_documents,
+    list_documents,
+    reads_available,
+    reads_degraded,
+)
 from models.constants import TABLE_PRODUCTS, TABLE_PRODUCT_IMAGES
+from services import catalog_store, deadline, invalidation_bus, replica
+from services.image_proxy import proxy_url
+from services.search_service import search_index
+from services.single_flight import SingleFlight
 import re
 
-def build_image_url(file_id: str) -> str:
+def build_image_url(file_id: str, width: int | None = None) -> str:
+    """
+    URL de una imagen del bucket. Por defecto pasa por el proxy /img/<file_id>
+    (cache en disco + resize a `width`); sin proxy apunta directo a Appwrite.
+    """
     file_id = (file_id or "").strip()
     if not file_id:
         return ""
 
+    if config.IMAGE_PROXY_ENABLED:
+        return proxy_url(file_id, config.IMAGE_PROXY_DEFAULT_WIDTH if width is None else width)
+
     bucket_id = (config.APPWRITE_BUCKET_PRODUCT_IMAGES or "").strip()
     if not bucket_id:
         return ""
@@ -70,56 +94,13 @@ MOCK_PRODUCTS = [
 ]
 
 
-def _headers():
-    return {
-        "X-Appwrite-Project": config.APPWRITE_PROJECT_ID,
-        "X-Appwrite-Key": config.APPWRITE_API_KEY,
-        "Content-Type": "application/json",
-    }
-
-
-def _base():
-    return config.APPWRITE_ENDPOINT.rstrip("/")
-
-
-def _collection_base(collection_id: str) -> str:
-    return f"{_base()}/databases/{config.APPWRITE_DATABASE_ID}/collections/{collection_id}/documents"
-
-
-def _list_all_documents(collection_id: str, limit: int = 100):
-    """
-    Trae TODOS los documentos de una collection usando paginación (offset/limit).
-    """
-    all_docs = []
-    offset = 0
-
-    while True:
-        url = _collection_base(collection_id)
-        params = {"limit": limit, "offset": offset}
-
-        r = requests.get(url, headers=_headers(), params=params, timeout=20)
-        if r.status_code >= 400:
-            raise RuntimeError(r.text)
-
-        data = r.json()
-        docs = data.get("documents", []) or []
-        total = data.get("total", len(docs))
-
-        all_docs.extend(docs)
-
-        offset += len(docs)
-        if offset >= total or not docs:
-            break
-
-    return all_docs
-
-
-def _product_images_map():
+def _product_images_map(docs=None):
     """
     Devuelve dict: { product_id: file_id }
     Si un producto tiene varias imágenes, usamos la primera que encontremos.
     """
-    docs = _list_all_documents(TABLE_PRODUCT_IMAGES, limit=100)
+    if docs is None:
+        docs = list_all_documents(TABLE_PRODUCT_IMAGES, batch_size=100)
 
     mapping = {}
     for d in docs:
@@ -151,49 +132,495 @@ def _normalize_product(doc: dict, image_file_id: str = "") -> dict:
         "color": doc.get("color", "Dorado") or "Dorado",
         "gold_type": doc.get("gold_type", "18k") or "18k",
         "slug": doc.get("slug", "") or "",
+        "$createdAt": doc.get("$createdAt", "") or "",
+        "$updatedAt": doc.get("$updatedAt", "") or "",
     }
 
 
-def list_products():
+def _category_key(category: str) -> str:
     """
-    Lista productos desde Appwrite.
-    Además, une products + product_images para construir image_url.
-    Si falla cualquier cosa, retorna MOCK_PRODUCTS.
+    Normaliza una categoria a slug: "Oro Laminado" -> "oro-laminado".
+    Asi /categoria/<slug> y products.category caen en el mismo bucket.
     """
+    category = (category or "").strip().lower()
+    return re.sub(r"[\s_-]+", "-", category).strip("-")
+
+
+# Cantidad de productos por categoria en la home
+HOME_PREVIEW_SIZE = 6
+
+# Filtros del catalogo: rangos de precio (key, label, min incluido, max excluido)
+PRICE_BANDS = [
+    ("hasta-30k", "Hasta $30.000", 0, 30000),
+    ("30k-60k", "$30.000 - $60.000", 30000, 60000),
+    ("60k-100k", "$60.000 - $100.000", 60000, 100000),
+    ("100k-mas", "Mas de $100.000", 100000, None),
+]
+
+# Orden del catalogo (key -> label). "" = orden de Appwrite
+SORT_OPTIONS = [
+    ("", "Destacados"),
+    ("price_asc", "Precio: menor a mayor"),
+    ("price_desc", "Precio: mayor a menor"),
+    ("newest", "Mas nuevos"),
+]
+
+# Facetas filtrables (nombre del parametro -> label del sidebar)
+FACETS = [
+    ("color", "Color"),
+    ("gold_type", "Baño"),
+    ("price", "Precio"),
+]
+
+
+def _price(p: dict) -> float:
     try:
-        # 1) Traer TODOS los productos
-        docs = _list_all_documents(TABLE_PRODUCTS, limit=100)
+        return float(p.get("base_price") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _price_band(price: float) -> str:
+    for key, _, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return key
+    return ""
+
+
+class CatalogSnapshot:
+    """
+    Foto inmutable del catalogo, indexada una sola vez por refresh:
+    - products: tupla en el orden de Appwrite
+    - by_id: { $id: product }
+    - by_category: { slug_categoria: (products...) }
+    - categories: categorias (texto original) ordenadas
+    - by_slug: { slug_producto: product }
+    - images_map: { product_id: file_id }
+    - home_preview: { categoria: (primeros HOME_PREVIEW_SIZE products) }
+    - facets: { "color"|"gold_type"|"price"|"category": { valor: bitset } }
+      (bitset = int, bit i -> products[i]; filtrar = AND de bitsets)
+    - facet_labels: { faceta: { valor: label } }
+    - orders: { "price_asc"|"price_desc"|"newest": (posiciones en products) }
+    - degraded: True si es el ultimo snapshot bueno del disco servido con Appwrite caido
+    """
+
+    __slots__ = (
+        "products", "by_id", "by_category", "categories", "by_slug", "images_map",
+        "home_preview", "all_mask", "facets", "facet_labels", "orders",
+        "version", "degraded",
+    )
+
+    def __init__(self, products=(), images_map=None, degraded: bool = False):
+        products = tuple(products)
+
+        by_id = {}
+        by_category = {}
+        by_slug = {}
+        categories = []
+
+        for p in products:
+            pid = p.get("$id") or ""
+            if pid:
+                by_id[pid] = p
+
+            slug = p.get("slug") or ""
+            if slug and slug not in by_slug:
+                by_slug[slug] = p
+
+            c = (p.get("category") or "").strip()
+            if c:
+                by_category.setdefault(_category_key(c), []).append(p)
+                if c not in categories:
+                    categories.append(c)
+
+        categories.sort()
+
+        object.__setattr__(self, "products", products)
+        object.__setattr__(self, "by_id", MappingProxyType(by_id))
+        object.__setattr__(self, "by_category", MappingProxyType(
+            {k: tuple(v) for k, v in by_category.items()}
+        ))
+        object.__setattr__(self, "categories", tuple(categories))
+        object.__setattr__(self, "by_slug", MappingProxyType(by_slug))
+        object.__setattr__(self, "images_map", MappingProxyType(dict(images_map or {})))
+
+        # Preview de la home (categorias + top N) armado en la misma pasada
+        object.__setattr__(self, "home_preview", MappingProxyType({
+            c: self.by_category.get(_category_key(c), ())[:HOME_PREVIEW_SIZE]
+            for c in self.categories
+        }))
+
+        # Facetas como bitsets (una pasada) + ordenes precalculados
+        facets = {"color": {}, "gold_type": {}, "price": {}, "category": {}}
+        labels = {"color": {}, "gold_type": {}, "price": {}, "category": {}}
+        price_labels = {key: label for key, label, _, _ in PRICE_BANDS}
+
+        for i, p in enumerate(products):
+            bit = 1 << i
+            values = {
+                "color": (_category_key(p.get("color")), (p.get("color") or "").strip()),
+                "gold_type": (_category_key(p.get("gold_type")), (p.get("gold_type") or "").strip()),
+                "category": (_category_key(p.get("category")), (p.get("category") or "").strip()),
+            }
+            band = _price_band(_price(p))
+            values["price"] = (band, price_labels.get(band, ""))
+
+            for facet, (key, label) in values.items():
+                if not key:
+                    continue
+                facets[facet][key] = facets[facet].get(key, 0) | bit
+                labels[facet].setdefault(key, label)
+
+        positions = range(len(products))
+        orders = {
+            "price_asc": tuple(sorted(positions, key=lambda i: _price(products[i]))),
+            "price_desc": tuple(sorted(positions, key=lambda i: -_price(products[i]))),
+            "newest": tuple(sorted(positions, key=lambda i: products[i].get("$createdAt") or "", reverse=True)),
+        }
 
-        # si Appwrite no tiene nada, mock
-        if not docs:
+        object.__setattr__(self, "all_mask", (1 << len(products)) - 1)
+        object.__setattr__(self, "facets", MappingProxyType({
+            f: MappingProxyType(v) for f, v in facets.items()
+        }))
+        object.__setattr__(self, "facet_labels", MappingProxyType({
+            f: MappingProxyType(v) for f, v in labels.items()
+        }))
+        object.__setattr__(self, "orders", MappingProxyType(orders))
+
+        # Version del contenido (igual en todos los workers): cambia si se crea,
+        # edita o borra un producto, o cambia su imagen. Base de los ETag (routes/shop.py)
+        digest = hashlib.sha1()
+        for p in products:
+            digest.update(f"{p.get('$id')}|{p.get('$updatedAt')}|{p.get('image_url')}\n".encode("utf-8"))
+        object.__setattr__(self, "version", digest.hexdigest()[:20] if products else "")
+        object.__setattr__(self, "degraded", degraded)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot es inmutable")
+
+    def __len__(self):
+        return len(self.products)
+
+    def select(self, mask: int, sort: str = ""):
+        """
+        Productos cuyo bit esta prendido en mask, en el orden pedido.
+        """
+        if not mask:
             return []
+        bits = format(mask, "b")[::-1]
+        order = self.orders.get(sort) or range(len(self.products))
+        n = len(bits)
+        return [self.products[i] for i in order if i < n and bits[i] == "1"]
+
+
+EMPTY_CATALOG = CatalogSnapshot()
+
+
+# Cache del catalogo (por proceso / worker de gunicorn).
+# - Sin snapshot: se carga sincrono (miss).
+# - Snapshot fresco: se sirve directo (hit).
+# - Snapshot vencido: se sirve el viejo y se refresca en un thread (stale).
+# - Entre workers: snapshot compartido en disco (services/catalog_store). Un worker
+#   nuevo arranca desde el archivo y solo uno a la vez refresca desde Appwrite.
+# - Appwrite caido (circuit breaker abierto): se sirve el ultimo snapshot bueno del
+#   disco marcado como degraded, y los refresh en segundo plano hacen de prueba.
+_catalog_lock = threading.Lock()
+_catalog_cache = {
+    "snapshot": None,
+    "loaded_at": 0.0,
+    "generation": 0,
+    "refreshing": False,
+    "bus_version": None,  # ultima version vista en services/invalidation_bus
+    "store_seq": 0,  # cuantos snapshots se guardaron (orden de _store_catalog)
+    "search_seq": 0,  # store_seq del ultimo snapshot indexado en search_index
+}
+_search_sync_lock = threading.Lock()
+# Cargas sincronas del catalogo (miss) concurrentes: una sola por generacion
+_catalog_loads = SingleFlight()
+_catalog_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stale_hits": 0,
+    "refreshes": 0,
+    "refresh_errors": 0,
+    "bus_invalidations": 0,
+    "shared_loads": 0,
+    "appwrite_loads": 0,
+    "degraded_loads": 0,
+    "refreshes_skipped": 0,
+}
+
+
+def _fetch_catalog() -> CatalogSnapshot:
+    """
+    Trae products + product_images desde Appwrite, une todo en image_url
+    y construye el snapshot indexado.
+    Lanza excepcion si Appwrite falla (el cache decide que hacer).
+    """
+    # 0) Replica local al dia: todo sale de SQLite, sin ir a Appwrite
+    if replica.ready(TABLE_PRODUCTS, TABLE_PRODUCT_IMAGES):
+        docs = replica.find(TABLE_PRODUCTS)
+        images_map = _product_images_map(replica.find(TABLE_PRODUCT_IMAGES)) if docs else {}
+    else:
+        # 1) Traer TODOS los productos
+        docs = list_all_documents(TABLE_PRODUCTS, batch_size=100)
 
         # 2) Traer mapa product_id -> file_id (desde product_images)
-        images_map = _product_images_map()
+        images_map = _product_images_map() if docs else {}
+
+    if not docs:
+        return EMPTY_CATALOG
+
+    # 3) Normalizar, inyectando file_id desde el mapa
+    products = []
+    for d in docs:
+        pid = d.get("$id") or d.get("id") or ""
+        file_id = images_map.get(pid, "")
+        products.append(_normalize_product(d, image_file_id=file_id))
+
+    return CatalogSnapshot(products, images_map)
 
-        # 3) Normalizar, inyectando file_id desde el mapa
-        products = []
-        for d in docs:
-            pid = d.get("$id") or d.get("id") or ""
-            file_id = images_map.get(pid, "")
-            products.append(_normalize_product(d, image_file_id=file_id))
 
-        return products
+def _load_shared(max_age: float | None = None):
+    """
+    Snapshot desde el archivo compartido entre workers (services/catalog_store).
+    Retorna (snapshot, written_at) o None si no hay, es mas viejo que max_age,
+    o el admin invalido el catalogo despues de escribirlo.
+    """
+    mtime = catalog_store.file_mtime()
+    if not mtime or (max_age is not None and time.time() - mtime > max_age):
+        return None  # chequeo barato (stat) antes de leer el archivo
+
+    res = catalog_store.read_snapshot()
+    if not res:
+        return None
+    header, products, images_map = res
+    if header.get("bus_version") != invalidation_bus.current():
+        return None
+
+    with _catalog_lock:
+        _catalog_stats["shared_loads"] += 1
+    return CatalogSnapshot(products, images_map), float(header.get("written_at") or 0)
+
+
+def _fetch_and_share():
+    """
+    Appwrite -> snapshot + reescribe el archivo compartido. Llamar con el RefreshLock tomado.
+    """
+    bus_version = invalidation_bus.current()  # antes de leer: si invalidan mientras, el archivo queda viejo
+    snapshot = _fetch_catalog()
+    with _catalog_lock:
+        _catalog_stats["appwrite_loads"] += 1
+    try:
+        catalog_store.write_snapshot(snapshot.products, snapshot.images_map, bus_version)
+    except OSError as e:
+        print("ERROR escribiendo snapshot del catalogo:", e)
+    return snapshot, time.time()
+
 
+def _load_catalog(blocking: bool):
+    """
+    Carga con un solo refresher entre todos los workers:
+    1) archivo compartido si esta fresco;
+    2) si ganamos el lock: Appwrite + reescribir el archivo;
+    3) si otro worker esta refrescando: esperarlo (blocking) y leer lo que escribio.
+    Retorna (snapshot, written_at), o None si no es blocking y otro worker esta refrescando.
+    """
+    shared = _load_shared(max_age=config.CATALOG_CACHE_TTL)
+    if shared:
+        return shared
+
+    lock = catalog_store.RefreshLock()
+    if lock.acquire(blocking=blocking, timeout=deadline.cap(config.APPWRITE_TIMEOUT_READ * 2)):
+        try:
+            # otro worker pudo haber terminado mientras esperabamos el lock
+            return _load_shared(max_age=config.CATALOG_CACHE_TTL) or _fetch_and_share()
+        finally:
+            lock.release()
+
+    if blocking:
+        # el refresher no termino a tiempo: vamos directo (sin reescribir el archivo)
+        return _fetch_catalog(), time.time()
+    return None
+
+
+def _load_last_good():
+    """
+    Ultimo snapshot bueno del disco, sin importar edad ni invalidaciones: solo
+    para cuando Appwrite no responde. Retorna (snapshot degraded, written_at) o None.
+    """
+    res = catalog_store.read_snapshot()
+    if not res:
+        return None
+    header, products, images_map = res
+    if not products:
+        return None
+
+    with _catalog_lock:
+        _catalog_stats["degraded_loads"] += 1
+    return CatalogSnapshot(products, images_map, degraded=True), float(header.get("written_at") or 0)
+
+
+def _store_catalog(snapshot: CatalogSnapshot, generation: int, written_at: float | None = None):
+    with _catalog_lock:
+        # si alguien invalido mientras cargabamos, este resultado ya es viejo
+        if generation != _catalog_cache["generation"]:
+            return False
+        # la edad del snapshot cuenta desde que se leyo de Appwrite (puede venir del archivo)
+        age = max(0.0, time.time() - written_at) if written_at else 0.0
+        _catalog_cache["snapshot"] = snapshot
+        _catalog_cache["loaded_at"] = time.monotonic() - age
+        _catalog_cache["store_seq"] += 1
+        seq = _catalog_cache["store_seq"]
+        _catalog_stats["refreshes"] += 1
+
+    # indice de busqueda: solo re-indexa lo que cambio respecto al snapshot anterior.
+    # Fuera de _catalog_lock (no frena las lecturas), pero en orden: si un snapshot
+    # mas nuevo ya se indexo, este se ignora y el indice no queda atras del catalogo
+    with _search_sync_lock:
+        if seq > _catalog_cache["search_seq"]:
+            search_index.sync(snapshot.products)
+            _catalog_cache["search_seq"] = seq
+    return True
+
+
+def _refresh_in_background(generation: int):
+    try:
+        loaded = _load_catalog(blocking=False)
+        if loaded:
+            _store_catalog(loaded[0], generation, loaded[1])
     except Exception as e:
-        print("ERROR list_products:", e)
-        return []  # nada de mock en producción
+        print("ERROR refresh catalogo:", e)
+        with _catalog_lock:
+            _catalog_stats["refresh_errors"] += 1
+    finally:
+        with _catalog_lock:
+            _catalog_cache["refreshing"] = False
 
 
+def _drop_snapshot():
+    # llamar con _catalog_lock tomado
+    _catalog_cache["snapshot"] = None
+    _catalog_cache["loaded_at"] = 0.0
+    _catalog_cache["generation"] += 1
 
-def get_product(product_id: str):
-    product_id = (product_id or "").strip()
-    products = list_products()
 
-    for p in products:
-        if p.get("$id") == product_id:
-            return p
+def invalidate_catalog_cache():
+    """
+    Descarta el snapshot actual (ej: despues de crear/borrar un producto).
+    La siguiente lectura vuelve a cargar desde Appwrite, en este worker y
+    (via invalidation_bus) en todos los demas.
+    """
+    version = invalidation_bus.bump()
+    with _catalog_lock:
+        _drop_snapshot()
+        _catalog_cache["bus_version"] = version
+
 
+def _check_bus():
+    """
+    Si otro worker invalido el catalogo (version del bus distinta), descartar el snapshot local.
+    Llamar con _catalog_lock tomado. Es una lectura de memoria (mmap).
+    """
+    version = invalidation_bus.current()
+    seen = _catalog_cache["bus_version"]
+    if version == seen:
+        return
+    if seen is not None:
+        _drop_snapshot()
+        _catalog_stats["bus_invalidations"] += 1
+    _catalog_cache["bus_version"] = version
+
+
+def catalog_cache_stats() -> dict:
+    with _catalog_lock:
+        stats = dict(_catalog_stats)
+        snapshot = _catalog_cache["snapshot"]
+        loaded_at = _catalog_cache["loaded_at"]
+        stats["cached"] = snapshot is not None
+        stats["size"] = len(snapshot) if snapshot is not None else 0
+        stats["age_seconds"] = round(time.monotonic() - loaded_at, 1) if snapshot is not None else None
+        stats["ttl_seconds"] = config.CATALOG_CACHE_TTL
+        stats["refreshing"] = _catalog_cache["refreshing"]
+        stats["bus_version"] = _catalog_cache["bus_version"]
+    stats["single_flight"] = _catalog_loads.stats()
+    return stats
+
+
+def get_catalog() -> CatalogSnapshot:
+    """
+    Snapshot del catalogo servido desde el cache.
+    Si Appwrite falla y no hay snapshot, retorna un catalogo vacio.
+    """
+    with _catalog_lock:
+        _check_bus()
+        snapshot = _catalog_cache["snapshot"]
+        age = time.monotonic() - _catalog_cache["loaded_at"]
+
+        if snapshot is not None:
+            if age < config.CATALOG_CACHE_TTL:
+                _catalog_stats["hits"] += 1
+                return snapshot
+
+            # vencido: servimos lo que hay y refrescamos en segundo plano
+            _catalog_stats["stale_hits"] += 1
+            if not reads_available():
+                # circuito abierto: no tiene sentido lanzar un refresh que falla al instante
+                _catalog_stats["refreshes_skipped"] += 1
+            elif not _catalog_cache["refreshing"]:
+                _catalog_cache["refreshing"] = True
+                threading.Thread(
+                    target=_refresh_in_background,
+                    args=(_catalog_cache["generation"],),
+                    daemon=True,
+                ).start()
+            return snapshot
+
+        _catalog_stats["misses"] += 1
+        generation = _catalog_cache["generation"]
+
+    # miss: cargamos sincrono (fuera del lock para no bloquear a los demas);
+    # los requests que llegan mientras tanto esperan esa misma carga
+    def load():
+        # arranque en caliente: ultimo snapshot bueno del disco aunque este vencido
+        # (se sirve y se refresca en segundo plano); si no hay, carga elegida
+        loaded = _load_shared() or _load_catalog(blocking=True)
+        _store_catalog(loaded[0], generation, loaded[1])
+        return loaded[0]
+
+    try:
+        return _catalog_loads.do(("catalog", generation), load)
+    except Exception as e:
+        print("ERROR get_catalog:", e)
+
+    # Appwrite caido: ultimo snapshot bueno del disco, guardado como ya vencido
+    # (aunque el archivo sea reciente) para que el proximo request pruebe refrescar
+    # apenas el breaker lo deje pasar
+    last_good = _load_last_good()
+    if last_good:
+        _store_catalog(last_good[0], generation, time.time() - config.CATALOG_CACHE_TTL)
+        return last_good[0]
+    return EMPTY_CATALOG  # nada de mock en producción
+
+
+def catalog_degraded() -> bool:
+    """
+    True si la tienda esta mostrando datos guardados porque Appwrite no responde.
+    """
+    with _catalog_lock:
+        snapshot = _catalog_cache["snapshot"]
+    return bool(snapshot is not None and snapshot.degraded) or reads_degraded()
+
+
+def list_products():
+    """
+    Lista productos desde Appwrite (products + product_images -> image_url),
+    servidos desde el cache del catalogo.
+    """
+    return list(get_catalog().products)
+
+
+def _not_found_product(product_id: str) -> dict:
     # fallback “no encontrado” (pero con formato correcto)
     return {
         "$id": product_id,
@@ -208,30 +635,244 @@ def get_product(product_id: str):
     }
 
 
+def _first_image_file_id(product_id: str) -> str:
+    """
+    file_id de la primera imagen de UN producto (query filtrada, sin listar todo).
+    """
+    if replica.ready(TABLE_PRODUCT_IMAGES):
+        docs = replica.find(TABLE_PRODUCT_IMAGES, {"product_id": product_id}, limit=1)
+        return (docs[0].get("file_id") or "").strip() if docs else ""
+
+    res = list_documents(TABLE_PRODUCT_IMAGES, queries=[Query.equal("product_id", product_id)], limit=1)
+    docs = res.get("documents", []) or []
+    return (docs[0].get("file_id") or "").strip() if docs else ""
+
+
+def _fetch_single_product(product_id: str, catalog: CatalogSnapshot):
+    """
+    Fallback para productos que aun no estan en el snapshot (ej: recien creados):
+    trae SOLO ese documento en vez de descargar todo el catalogo.
+    """
+    doc = replica.get(TABLE_PRODUCTS, product_id) if replica.ready(TABLE_PRODUCTS) else None
+    if not doc:
+        doc = get_document(TABLE_PRODUCTS, product_id)
+    if not doc:
+        return None
+
+    file_id = catalog.images_map.get(product_id, "")
+    if not file_id:
+        try:
+            file_id = _first_image_file_id(product_id)
+        except Exception as e:
+            print("ERROR imagen de producto:", e)
+
+    return _normalize_product(doc, image_file_id=file_id)
+
+
+def get_product(product_id: str):
+    product_id = (product_id or "").strip()
+    if not product_id:
+        return _not_found_product(product_id)
+
+    catalog = get_catalog()
+    # /producto/<id> acepta tambien el slug del producto (mismo indice del snapshot)
+    product = catalog.by_id.get(product_id) or catalog.by_slug.get(product_id.lower())
+    if product:
+        return product
+
+    try:
+        product = _fetch_single_product(product_id, catalog)
+    except Exception as e:
+        print("ERROR get_product:", e)
+        product = None
+
+    return product or _not_found_product(product_id)
+
+
+def get_image_urls(product_ids) -> dict:
+    """
+    { product_id: image_url } para varios productos de una vez.
+    Primero desde el snapshot; los que falten (ej: productos borrados o nuevos)
+    se resuelven con UNA query a product_images (Query.equal con lista = IN).
+    """
+    catalog = get_catalog()
+    urls = {}
+    missing = []
+
+    for pid in dict.fromkeys(p for p in product_ids if p):
+        product = catalog.by_id.get(pid)
+        if product is not None:
+            urls[pid] = (product.get("image_url") or "").strip()
+        elif pid in catalog.images_map:
+            urls[pid] = build_image_url(catalog.images_map[pid])
+        else:
+            missing.append(pid)
+
+    if missing:
+        try:
+            docs = list_all_documents(
+                TABLE_PRODUCT_IMAGES,
+                queries=[Query.equal("product_id", missing)],
+                batch_size=100,
+            )
+            for d in docs:
+                pid = (d.get("product_id") or "").strip()
+                fid = (d.get("file_id") or "").strip()
+                if pid and fid and pid not in urls:
+                    urls[pid] = build_image_url(fid)
+        except Exception as e:
+            print("ERROR get_image_urls:", e)
+
+    return urls
+
+
+def get_product_by_slug(slug: str):
+    """
+    Producto por slug desde el indice del snapshot (O(1)). None si no existe.
+    """
+    slug = (slug or "").strip().lower()
+    return get_catalog().by_slug.get(slug)
+
+
 def list_products_by_category(category: str):
-    category = (category or "").strip().lower()
-    products = list_products()
+    catalog = get_catalog()
+    key = _category_key(category)
 
-    if not category:
-        return products
+    if not key:
+        return list(catalog.products)
 
-    return [
-        p for p in products
-        if (p.get("category") or "").strip().lower() == category
-    ]
+    return list(catalog.by_category.get(key, ()))
 
 
 def list_categories():
-    products = list_products()
-    categories = []
+    return list(get_catalog().categories)
+
+
+def paginate(items, page=1, per_page=None) -> dict:
+    """
+    Corta una lista (ya cacheada) en una pagina. page/per_page vienen del querystring,
+    asi que se sanean y per_page se limita a CATALOG_MAX_PAGE_SIZE.
+    """
+    try:
+        per_page = int(per_page or config.CATALOG_PAGE_SIZE)
+    except (TypeError, ValueError):
+        per_page = config.CATALOG_PAGE_SIZE
+    per_page = max(1, min(per_page, config.CATALOG_MAX_PAGE_SIZE))
+
+    total = len(items)
+    pages = max(1, -(-total // per_page))
+
+    try:
+        page = int(page or 1)
+    except (TypeError, ValueError):
+        page = 1
+    page = max(1, min(page, pages))
+
+    start = (page - 1) * per_page
+    return {
+        "items": list(items[start:start + per_page]),
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": pages,
+        "has_prev": page > 1,
+        "has_next": page < pages,
+        "prev_page": page - 1,
+        "next_page": page + 1,
+    }
 
-    for p in products:
-        c = (p.get("category") or "").strip()
-        if c and c not in categories:
-            categories.append(c)
 
-    categories.sort()
-    return categories
+def search_products(query: str, limit: int | None = None):
+    """
+    Busqueda en el catalogo cacheado (indice invertido en memoria, sin Appwrite).
+    Sin limit retorna todos los resultados ordenados por relevancia (la ruta pagina).
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    catalog = get_catalog()
+    results = []
+    for pid, _ in search_index.search(query, limit=limit or len(catalog.products)):
+        p = catalog.by_id.get(pid)
+        if p:
+            results.append(p)
+    return results
+
+
+def browse_products(category: str = "", filters=None) -> dict:
+    """
+    Catalogo filtrado y ordenado (interseccion de bitsets del snapshot, sin re-escanear).
+    filters: { color, gold_type, price, sort } (ej: request.args).
+    Retorna { products, selected, sort, facets: [ {name, label, options: [...] } ] }
+    donde cada opcion trae el conteo con el resto de filtros aplicados.
+    """
+    catalog = get_catalog()
+    filters = filters or {}
+
+    base = catalog.all_mask
+    key = _category_key(category)
+    if key:
+        base = catalog.facets["category"].get(key, 0)
+
+    selected = {}
+    for name, _ in FACETS:
+        value = _category_key(filters.get(name))
+        if value:
+            selected[name] = value
+
+    sort = (filters.get("sort") or "").strip()
+    if sort not in catalog.orders:
+        sort = ""
+
+    def mask_without(skip: str) -> int:
+        mask = base
+        for name, value in selected.items():
+            if name != skip:
+                mask &= catalog.facets[name].get(value, 0)
+        return mask
+
+    facets = []
+    for name, label in FACETS:
+        others = mask_without(name)
+        options = []
+        for value, bits in catalog.facets[name].items():
+            count = (others & bits).bit_count()
+            if count or selected.get(name) == value:
+                options.append({
+                    "value": value,
+                    "label": catalog.facet_labels[name].get(value, value),
+                    "count": count,
+                    "selected": selected.get(name) == value,
+                })
+
+        if name == "price":
+            band_order = [k for k, _, _, _ in PRICE_BANDS]
+            options.sort(key=lambda o: band_order.index(o["value"]))
+        else:
+            options.sort(key=lambda o: o["label"].lower())
+
+        facets.append({"name": name, "label": label, "options": options})
+
+    return {
+        "products": catalog.select(mask_without(""), sort),
+        "selected": selected,
+        "sort": sort,
+        "sort_options": SORT_OPTIONS,
+        "facets": facets,
+    }
+
+
+def get_home_page():
+    """
+    Datos de la home desde UNA lectura del catalogo:
+    { "categories": [...], "products_by_cat": { categoria: [max 6 products] } }
+    """
+    catalog = get_catalog()
+    return {
+        "categories": catalog.categories,
+        "products_by_cat": catalog.home_preview,
+    }
 
 def _slugify(text: str) -> str:
     text = (text or "").strip().lower()
@@ -272,37 +913,35 @@ def create_product(
 
     slug = _slugify(name)
 
-    url = _collection_base(TABLE_PRODUCTS)
-    payload = {
-        "documentId": "unique()",
-        "data": {
-            "name": name,
-            "base_price": base_price,
-            "category": category,
-            "description": description,
-            "color": color,
-            "gold_type": gold_type,
-            "slug": slug,
-            # "image_url": image_url,
-            "is_active": bool(is_active)
-        }
+    data = {
+        "name": name,
+        "base_price": base_price,
+        "category": category,
+        "description": description,
+        "color": color,
+        "gold_type": gold_type,
+        "slug": slug,
+        # "image_url": image_url,
+        "is_active": bool(is_active)
     }
 
-    r = requests.post(url, headers=_headers(), json=payload, timeout=20)
-    if r.status_code >= 400:
-        print("APPWRITE ERROR create_product:", r.status_code, r.text)
-        raise RuntimeError(r.text)
-    return r.json()
+    try:
+        doc = create_document(TABLE_PRODUCTS, data)
+    except Exception as e:
+        print("APPWRITE ERROR create_product:", e)
+        raise
+    replica.write_through(TABLE_PRODUCTS, doc)
+    invalidate_catalog_cache()
+    return doc
 
 def delete_product(product_id: str):
     product_id = (product_id or "").strip()
     if not product_id:
         raise ValueError("product_id requerido")
 
-    url = f"{_collection_base(TABLE_PRODUCTS)}/{product_id}"
-    r = requests.delete(url, headers=_headers(), timeout=20)
-    if r.status_code >= 400:
-        raise RuntimeError(r.text)
+    delete_document(TABLE_PRODUCTS, product_id)
+    replica.write_through(TABLE_PRODUCTS, deleted_id=product_id)
+    invalidate_catalog_cache()
     return True
 
 def _delete_product_images_docs(product_id: str):
@@ -314,17 +953,15 @@ def _delete_product_images_docs(product_id: str):
     if not product_id:
         return
 
-    docs = _list_all_documents(TABLE_PRODUCT_IMAGES, limit=100)
+    docs = list_all_documents(TABLE_PRODUCT_IMAGES, batch_size=100)
 
     for d in docs:
         pid = (d.get("product_id") or "").strip()
         if pid == product_id:
             doc_id = (d.get("$id") or "").strip()
             if doc_id:
-                url = f"{_collection_base(TABLE_PRODUCT_IMAGES)}/{doc_id}"
-                r = requests.delete(url, headers=_headers(), timeout=20)
-                if r.status_code >= 400:
-                    raise RuntimeError(r.text)
+                delete_document(TABLE_PRODUCT_IMAGES, doc_id)
+                replica.write_through(TABLE_PRODUCT_IMAGES, deleted_id=doc_id)
 
 
 def delete_product_cascade(product_id: str):
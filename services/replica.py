@@ -0,0 +1,381 @@
+# services/replica.py
+"""
+Replica local de lectura (SQLite en DATA_DIR) de products, product_images,
+orders y order_items.
+
+- Primera vez: carga completa de cada collection.
+- Despues: solo documentos con $updatedAt >= watermark (delta sync), cada
+  REPLICA_SYNC_INTERVAL segundos. Se pagina con cursor (cursorAfter), no con
+  offset: un documento editado durante el scan no corre a los demas de lugar.
+- Cada REPLICA_RECONCILE_INTERVAL: se listan $id + $updatedAt remotos, se borran
+  los locales que ya no existen (las borradas no aparecen en el delta) y se
+  vuelven a traer los que difieren (por si el delta se salteo alguno).
+- Un solo worker sincroniza a la vez (flock); todos leen el mismo archivo.
+- Las escrituras de la app (crear/borrar producto, pedidos, estado) se aplican
+  tambien aca (write-through) para que la replica no quede atras de lo propio.
+
+Con REPLICA_ENABLED=0 (default) no se sincroniza nada y ready() es siempre False:
+los services siguen leyendo de Appwrite como antes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from appwrite.query import Query
+
+from config import config
+from models.constants import TABLE_ORDER_ITEMS, TABLE_ORDERS, TABLE_PRODUCT_IMAGES, TABLE_PRODUCTS
+from services.appwrite_gateway import list_documents
+from services.catalog_store import RefreshLock
+
+PAGE_SIZE = 100
+DB_FILENAME = "replica.sqlite3"
+LOCK_FILENAME = "replica_sync.lock"
+
+# collection -> columnas extra (atributo del documento) con indice
+COLLECTIONS = {
+    TABLE_PRODUCTS: ["category", "slug"],
+    TABLE_PRODUCT_IMAGES: ["product_id"],
+    TABLE_ORDERS: ["status", "user_id"],
+    TABLE_ORDER_ITEMS: ["order_id", "product_id"],
+}
+
+_local = threading.local()
+_worker_lock = threading.Lock()
+_worker_state = {"pid": None, "thread": None}
+_stats_lock = threading.Lock()
+_stats = {"syncs": 0, "docs_synced": 0, "reconciles": 0, "docs_deleted": 0, "docs_refreshed": 0, "errors": 0}
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(config.DATA_DIR, DB_FILENAME), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for table, columns in COLLECTIONS.items():
+        extra = "".join(f", {c} TEXT NOT NULL DEFAULT ''" for c in columns)
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                doc_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL DEFAULT '',
+                updated_at TEXT NOT NULL DEFAULT ''{extra},
+                data TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created ON {table} (created_at)")
+        for c in columns:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{c} ON {table} ({c}, created_at)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            collection TEXT PRIMARY KEY,
+            watermark TEXT NOT NULL DEFAULT '',
+            loaded_at REAL NOT NULL DEFAULT 0,
+            synced_at REAL NOT NULL DEFAULT 0,
+            reconciled_at REAL NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.commit()
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _state(conn, collection: str) -> dict:
+    row = conn.execute(
+        "SELECT watermark, loaded_at, synced_at, reconciled_at FROM sync_state WHERE collection = ?",
+        (collection,),
+    ).fetchone()
+    if not row:
+        return {"watermark": "", "loaded_at": 0.0, "synced_at": 0.0, "reconciled_at": 0.0}
+    return dict(zip(("watermark", "loaded_at", "synced_at", "reconciled_at"), row))
+
+
+def _set_state(conn, collection: str, **values):
+    state = _state(conn, collection)
+    state.update(values)
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO sync_state (collection, watermark, loaded_at, synced_at, reconciled_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (collection, state["watermark"], state["loaded_at"], state["synced_at"], state["reconciled_at"]),
+    )
+
+
+# ---------- Escritura ----------
+
+def _rows(collection: str, docs):
+    columns = COLLECTIONS[collection]
+    for d in docs or []:
+        doc_id = (d.get("$id") or "").strip()
+        if not doc_id:
+            continue
+        yield (
+            doc_id,
+            d.get("$createdAt") or "",
+            d.get("$updatedAt") or "",
+            *[str(d.get(c) or "").strip() for c in columns],
+            json.dumps(d),
+        )
+
+
+def upsert(collection: str, docs) -> int:
+    """
+    Inserta/actualiza documentos (por $id). Tambien se usa como write-through.
+    """
+    if collection not in COLLECTIONS:
+        return 0
+    rows = list(_rows(collection, docs))
+    if not rows:
+        return 0
+
+    columns = ["doc_id", "created_at", "updated_at", *COLLECTIONS[collection], "data"]
+    placeholders = ", ".join("?" for _ in columns)
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {collection} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows,
+        )
+    return len(rows)
+
+
+def delete(collection: str, doc_ids) -> int:
+    if collection not in COLLECTIONS:
+        return 0
+    doc_ids = [d for d in doc_ids or [] if d]
+    if not doc_ids:
+        return 0
+    conn = _conn()
+    with conn:
+        conn.executemany(f"DELETE FROM {collection} WHERE doc_id = ?", [(d,) for d in doc_ids])
+    return len(doc_ids)
+
+
+def write_through(collection: str, doc=None, deleted_id: str = ""):
+    """
+    Aplica una escritura propia de la app. Nunca falla hacia afuera: si la replica
+    queda atras, el proximo sync la corrige.
+    """
+    if not config.REPLICA_ENABLED:
+        return
+    try:
+        if doc:
+            upsert(collection, [doc])
+        if deleted_id:
+            delete(collection, [deleted_id])
+    except Exception as e:
+        print(f"ERROR write-through replica {collection}:", e)
+
+
+# ---------- Sync ----------
+
+def _pull(collection: str, queries) -> list:
+    """
+    Todas las paginas de una consulta usando cursor ($id del ultimo documento).
+    """
+    docs = []
+    cursor = ""
+    while True:
+        page_queries = list(queries)
+        if cursor:
+            page_queries.append(Query.cursor_after(cursor))
+        res = list_documents(collection, queries=page_queries, limit=PAGE_SIZE)
+        batch = res.get("documents", []) or []
+        docs.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            return docs
+        cursor = batch[-1].get("$id") or ""
+        if not cursor:
+            return docs
+
+
+def sync_collection(collection: str) -> int:
+    """
+    Delta sync por $updatedAt (o carga completa la primera vez). Retorna documentos recibidos.
+    """
+    conn = _conn()
+    state = _state(conn, collection)
+    watermark = state["watermark"]
+
+    queries = [Query.order_asc("$updatedAt")]
+    if watermark:
+        # >= para no perder documentos con el mismo timestamp; el upsert deduplica
+        queries.insert(0, Query.greater_than_equal("$updatedAt", watermark))
+
+    docs = _pull(collection, queries)
+    upsert(collection, docs)
+
+    newest = max((d.get("$updatedAt") or "" for d in docs), default="")
+    now = time.time()
+    with conn:
+        values = {"synced_at": now}
+        if newest > watermark:
+            values["watermark"] = newest
+        if not state["loaded_at"]:
+            values["loaded_at"] = now
+        _set_state(conn, collection, **values)
+
+    with _stats_lock:
+        _stats["syncs"] += 1
+        _stats["docs_synced"] += len(docs)
+    return len(docs)
+
+
+def reconcile_collection(collection: str) -> int:
+    """
+    Compara $id + $updatedAt remotos con la replica: borra los que ya no existen
+    y vuelve a traer los que faltan o cambiaron. Retorna cuantos borro.
+    """
+    remote = _pull(collection, [Query.select(["$id", "$updatedAt"]), Query.order_asc("$id")])
+    remote_updated = {(d.get("$id") or ""): (d.get("$updatedAt") or "") for d in remote}
+
+    conn = _conn()
+    local_updated = dict(conn.execute(f"SELECT doc_id, updated_at FROM {collection}"))
+    gone = [doc_id for doc_id in local_updated if doc_id not in remote_updated]
+    delete(collection, gone)
+
+    stale = [
+        doc_id for doc_id, updated_at in remote_updated.items()
+        if doc_id and local_updated.get(doc_id) != updated_at
+    ]
+    refreshed = 0
+    for i in range(0, len(stale), PAGE_SIZE):
+        ids = stale[i:i + PAGE_SIZE]
+        res = list_documents(collection, queries=[Query.equal("$id", ids)], limit=len(ids))
+        refreshed += upsert(collection, res.get("documents", []) or [])
+
+    with conn:
+        _set_state(conn, collection, reconciled_at=time.time())
+    with _stats_lock:
+        _stats["reconciles"] += 1
+        _stats["docs_deleted"] += len(gone)
+        _stats["docs_refreshed"] += refreshed
+    return len(gone)
+
+
+def sync_all():
+    """
+    Una pasada del motor: delta de cada collection y reconcile si toca.
+    Solo la hace el worker que tiene el lock; retorna False si otro la esta haciendo.
+    """
+    lock = RefreshLock(LOCK_FILENAME)
+    if not lock.acquire(blocking=False):
+        return False
+    try:
+        for collection in COLLECTIONS:
+            try:
+                sync_collection(collection)
+                state = _state(_conn(), collection)
+                if time.time() - state["reconciled_at"] >= config.REPLICA_RECONCILE_INTERVAL:
+                    reconcile_collection(collection)
+            except Exception as e:
+                print(f"ERROR sync replica {collection}:", e)
+                with _stats_lock:
+                    _stats["errors"] += 1
+    finally:
+        lock.release()
+    return True
+
+
+def _run_worker():
+    while True:
+        try:
+            sync_all()
+        except Exception as e:
+            print("ERROR replica worker:", e)
+        time.sleep(config.REPLICA_SYNC_INTERVAL)
+
+
+def start_sync():
+    """
+    Arranca el thread de sync en este proceso (una vez por pid). No hace nada si la replica esta apagada.
+    """
+    if not config.REPLICA_ENABLED:
+        return
+    pid = os.getpid()
+    with _worker_lock:
+        thread = _worker_state["thread"]
+        if _worker_state["pid"] == pid and thread and thread.is_alive():
+            return
+        thread = threading.Thread(target=_run_worker, name="replica-sync", daemon=True)
+        thread.start()
+        _worker_state.update({"pid": pid, "thread": thread})
+
+
+# ---------- Lectura ----------
+
+def ready(*collections) -> bool:
+    """
+    True si la replica esta activa, cargada y sincronizada hace poco para todas las collections.
+    """
+    if not config.REPLICA_ENABLED:
+        return False
+    try:
+        conn = _conn()
+        now = time.time()
+        for collection in collections:
+            state = _state(conn, collection)
+            if not state["loaded_at"] or now - state["synced_at"] > config.REPLICA_MAX_LAG:
+                return False
+        return True
+    except sqlite3.Error as e:
+        print("ERROR leyendo estado de la replica:", e)
+        return False
+
+
+def get(collection: str, doc_id: str):
+    row = _conn().execute(f"SELECT data FROM {collection} WHERE doc_id = ?", (doc_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def find(collection: str, where: dict | None = None, order_by: str = "created_at", desc: bool = False,
+         limit: int | None = None):
+    """
+    Documentos filtrados por columnas indexadas (igualdad). order_by: created_at | updated_at.
+    """
+    where = where or {}
+    allowed = set(COLLECTIONS[collection])
+    if any(k not in allowed for k in where) or order_by not in ("created_at", "updated_at"):
+        raise ValueError("filtro u orden no indexado en la replica")
+
+    sql = f"SELECT data FROM {collection}"
+    if where:
+        sql += " WHERE " + " AND ".join(f"{k} = ?" for k in where)
+    sql += f" ORDER BY {order_by} {'DESC' if desc else 'ASC'}, doc_id"
+    params = list(where.values())
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [json.loads(r[0]) for r in _conn().execute(sql, params)]
+
+
+def replica_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["enabled"] = config.REPLICA_ENABLED
+    if not config.REPLICA_ENABLED:
+        return stats
+
+    conn = _conn()
+    now = time.time()
+    stats["collections"] = {}
+    for collection in COLLECTIONS:
+        state = _state(conn, collection)
+        stats["collections"][collection] = {
+            "docs": conn.execute(f"SELECT COUNT(*) FROM {collection}").fetchone()[0],
+            "watermark": state["watermark"],
+            "lag_seconds": round(now - state["synced_at"], 1) if state["synced_at"] else None,
+        }
+    return stats
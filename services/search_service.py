@@ -0,0 +1,276 @@
+# services/search_service.py
+"""
+Busqueda en memoria sobre el catalogo (indice invertido).
+
+- Indexa name, description, category, color y gold_type de los productos normalizados.
+- Sin tildes ni mayusculas ("Baño" == "bano"), plurales/genero en español
+  reducidos a una raiz simple ("pulseras" -> "pulser", "dorada" -> "dorad").
+- Prefijos: "manil" encuentra "manilla".
+- Se actualiza incremental cuando cambia el snapshot (solo productos nuevos/cambiados).
+- Nunca llama a Appwrite.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+# Peso de cada campo en el ranking
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "color": 1.5,
+    "gold_type": 1.5,
+    "description": 1.0,
+}
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los",
+    "o", "para", "por", "sin", "su", "un", "una", "y",
+}
+
+# Un termino parcial corto matchea demasiado: prefijos desde 2 letras y max N expansiones
+MIN_PREFIX_LEN = 2
+MAX_PREFIX_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _stem(token: str) -> str:
+    # plural y genero: "aretes" -> "arete" -> "aret", "collares" -> "collare" -> "collar"
+    if len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str):
+    return [
+        _stem(t) for t in _TOKEN_RE.findall(_fold(text))
+        if t not in STOPWORDS
+    ]
+
+
+def _scaled(ranked, factor: float):
+    for neg_w, pid in ranked:
+        yield -neg_w * factor, pid
+
+
+def _fingerprint(product: dict):
+    return tuple(str(product.get(f) or "") for f in FIELD_WEIGHTS)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}   # termino -> { product_id: peso }
+        self._docs = {}       # product_id -> (fingerprint, terminos)
+        self._terms = []      # terminos ordenados (para prefijos)
+        self._terms_dirty = False
+        self._ranked = {}     # termino -> [(-peso, product_id)] ordenado (mayor peso primero)
+        self._dirty = set()   # terminos a re-ordenar completos al final del sync
+        self._bulk = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---------- escritura ----------
+
+    def _add(self, pid: str, product: dict, fingerprint):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(product.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+
+        for term, w in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._terms_dirty = True
+            postings[pid] = w
+            self._mark(term, (-w, pid), add=True)
+
+        self._docs[pid] = (fingerprint, tuple(weights))
+
+    def _mark(self, term: str, entry, add: bool):
+        """
+        Mantiene la lista rankeada del termino: en cambios chicos se inserta/borra
+        en su lugar (bisect); en cargas masivas se re-ordena una vez al final.
+        """
+        ranked = self._ranked.get(term)
+        if self._bulk or ranked is None or term in self._dirty:
+            self._dirty.add(term)
+            return
+        if add:
+            insort(ranked, entry)
+        else:
+            i = bisect_left(ranked, entry)
+            if i < len(ranked) and ranked[i] == entry:
+                del ranked[i]
+
+    def _remove(self, pid: str):
+        entry = self._docs.pop(pid, None)
+        if not entry:
+            return
+        for term in entry[1]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            w = postings.pop(pid, None)
+            if w is not None:
+                self._mark(term, (-w, pid), add=False)
+            if not postings:
+                del self._postings[term]
+                self._ranked.pop(term, None)
+                self._terms_dirty = True
+
+    def sync(self, products) -> dict:
+        """
+        Deja el indice igual al catalogo recibido, tocando solo lo que cambio.
+        Retorna { added, updated, removed }.
+        """
+        seen = set()
+        changed = []
+        added = updated = removed = 0
+
+        with self._lock:
+            for p in products:
+                pid = p.get("$id") or ""
+                if not pid:
+                    continue
+                seen.add(pid)
+
+                fp = _fingerprint(p)
+                current = self._docs.get(pid)
+                if not current or current[0] != fp:
+                    changed.append((pid, p, fp, current))
+
+            gone = [pid for pid in self._docs if pid not in seen]
+            self._bulk = len(changed) + len(gone) > max(100, len(self._docs) // 20)
+
+            for pid, p, fp, current in changed:
+                if current:
+                    self._remove(pid)
+                    updated += 1
+                else:
+                    added += 1
+                self._add(pid, p, fp)
+
+            for pid in gone:
+                self._remove(pid)
+                removed += 1
+
+            for term in self._dirty:
+                postings = self._postings.get(term)
+                if postings:
+                    self._ranked[term] = sorted((-w, pid) for pid, w in postings.items())
+                else:
+                    self._ranked.pop(term, None)
+            self._dirty.clear()
+            self._bulk = False
+
+            if self._terms_dirty:
+                self._terms = sorted(self._postings)
+                self._terms_dirty = False
+
+        return {"added": added, "updated": updated, "removed": removed}
+
+    # ---------- lectura ----------
+
+    def _expand(self, term: str):
+        """
+        Terminos del indice que matchean: exacto (peso completo) y prefijos (peso reducido).
+        """
+        matches = {}
+        if term in self._postings:
+            matches[term] = 1.0
+
+        if len(term) >= MIN_PREFIX_LEN:
+            i = bisect_left(self._terms, term)
+            n = 0
+            while i < len(self._terms) and n < MAX_PREFIX_EXPANSIONS:
+                t = self._terms[i]
+                if not t.startswith(term):
+                    break
+                if t not in matches:
+                    matches[t] = 0.5
+                    n += 1
+                i += 1
+
+        return matches
+
+    def search(self, query: str, limit: int = 50):
+        """
+        Retorna [(product_id, score)] ordenado por relevancia.
+        Todos los terminos de la consulta deben aparecer (AND).
+
+        Se recorre el termino mas selectivo de mayor a menor peso y se corta
+        apenas ningun candidato restante puede superar al top-N (threshold),
+        asi una consulta comun no recorre todo el catalogo.
+        """
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+
+        with self._lock:
+            expanded = []
+            for term in terms:
+                matches = self._expand(term)
+                if not matches:
+                    return []
+                size = sum(len(self._postings[t]) for t in matches)
+                best = max(-self._ranked[t][0][0] * f for t, f in matches.items())
+                expanded.append((size, best, matches))
+
+            # driver = termino con menos postings
+            expanded.sort(key=lambda x: x[0])
+            _, _, driver = expanded[0]
+            others = [m for _, _, m in expanded[1:]]
+            others_bound = sum(best for _, best, _ in expanded[1:])
+
+            candidates = heapq.merge(
+                *[_scaled(self._ranked[t], f) for t, f in driver.items()],
+                key=lambda x: -x[0],
+            )
+
+            top = []   # heap (score, -orden) de los mejores N
+            seen = set()
+            for score, pid in candidates:
+                if len(top) >= limit and top[0][0] >= score + others_bound:
+                    break
+                if pid in seen:
+                    continue
+                seen.add(pid)
+
+                total = score
+                for matches in others:
+                    s = max((self._postings[t].get(pid, 0.0) * f for t, f in matches.items()), default=0.0)
+                    if not s:
+                        total = None
+                        break
+                    total += s
+                if total is None:
+                    continue
+
+                item = (total, -len(seen), pid)
+                if len(top) < limit:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+
+        ranked = sorted(top, reverse=True)
+        return [(pid, score) for score, _, pid in ranked]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._docs), "terms": len(self._postings)}
+
+
+# Indice del proceso (lo mantiene product_service en cada refresh del catalogo)
+search_index = SearchIndex()
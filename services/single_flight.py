@@ -0,0 +1,83 @@
+# services/single_flight.py
+"""
+Single-flight: llamadas concurrentes con la misma clave esperan a una sola
+ejecucion en curso y comparten su resultado (o su excepcion).
+
+Evita que una rafaga de trafico con el cache frio dispare N lecturas
+identicas a Appwrite desde el mismo worker.
+
+Los que esperan respetan su propio presupuesto (services/deadline): no esperan
+mas de lo que les queda, y si al lider se le acabo SU presupuesto, reintentan.
+"""
+import threading
+
+from services import deadline
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {"calls": 0, "executed": 0, "collapsed": 0, "in_flight": 0, "wait_timeouts": 0}
+
+    def do(self, key, fn, copy=None):
+        """
+        Ejecuta fn() una sola vez por clave a la vez. Los que llegan mientras
+        corre reciben el mismo resultado (pasado por copy() si se indica,
+        para que nadie modifique la lista/dict de otro).
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                    self._stats["executed"] += 1
+                else:
+                    self._stats["collapsed"] += 1
+
+            if leader:
+                break
+
+            left = deadline.remaining()
+            if not flight.event.wait(timeout=None if left is None else max(0.0, left)):
+                with self._lock:
+                    self._stats["wait_timeouts"] += 1
+                deadline.record_exceeded()
+                raise deadline.DeadlineExceeded("se acabo el tiempo del request esperando otra carga")
+            if isinstance(flight.error, deadline.DeadlineExceeded):
+                # al lider se le acabo su presupuesto, no el nuestro: intentar de nuevo
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return copy(flight.result) if copy else flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
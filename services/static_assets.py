@@ -0,0 +1,84 @@
+# services/static_assets.py
+"""
+Assets estaticos con hash (generados por tools/build_assets.py).
+
+static_url("css/styles.css") -> "/assets/css/styles.<hash>.css" si el asset esta en
+el manifest; si no (dev, sin build) cae en la ruta /static/ normal.
+
+/assets/ sirve tanto el build actual como los anteriores que el build conserva
+(manifest["releases"]): el HTML viejo en cache sigue encontrando sus archivos.
+"""
+import json
+import os
+import threading
+import time
+
+from flask import url_for
+
+from config import config
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIST_DIR = os.path.join(BASE_DIR, "static", "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# Cada cuanto (segundos) se revisa si el manifest cambio en disco
+CHECK_INTERVAL = 10
+
+_lock = threading.Lock()
+_state = {"manifest": {}, "by_path": {}, "mtime": None, "checked_at": 0.0}
+
+
+def _manifest() -> dict:
+    now = time.monotonic()
+    if now - _state["checked_at"] < CHECK_INTERVAL:
+        return _state["manifest"]
+
+    with _lock:
+        if now - _state["checked_at"] < CHECK_INTERVAL:
+            return _state["manifest"]
+        _state["checked_at"] = now
+        try:
+            mtime = os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            _state.update({"manifest": {}, "by_path": {}, "mtime": None})
+            return _state["manifest"]
+
+        if mtime != _state["mtime"]:
+            try:
+                with open(MANIFEST_PATH, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                by_path = {}
+                # del build mas viejo al actual: el actual gana si un path se repite
+                for release in reversed(manifest.get("releases") or []):
+                    by_path.update({a["path"]: a for a in release if isinstance(a, dict)})
+                by_path.update({a["path"]: a for a in (manifest.get("assets") or {}).values()})
+                _state.update({"manifest": manifest, "by_path": by_path, "mtime": mtime})
+            except (OSError, ValueError) as e:
+                print("ERROR leyendo manifest de assets:", e)
+        return _state["manifest"]
+
+
+def asset_info(dist_path: str):
+    """
+    Entrada del manifest (build actual o uno conservado) para un path dentro de
+    static/dist (lo que pide /assets/).
+    """
+    _manifest()
+    return _state["by_path"].get(dist_path)
+
+
+def static_url(filename: str) -> str:
+    filename = (filename or "").lstrip("/")
+    asset = (_manifest().get("assets") or {}).get(filename)
+    if asset:
+        return f"/assets/{asset['path']}"
+    return url_for("static", filename=filename)
+
+
+def critical_css() -> str:
+    """
+    CSS critico para inlinear en el <head> (vacio si esta desactivado o no hay build).
+    """
+    if not config.STATIC_INLINE_CRITICAL_CSS:
+        return ""
+    return _manifest().get("critical_css") or ""
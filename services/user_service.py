@@ -1,62 +1,31 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from appwrite.client import Client
-from appwrite.services.databases import Databases
 from appwrite.query import Query
 
 from config import config
 from models.constants import TABLE_USERS
+from services.appwrite_gateway import create_document, list_documents
 
 
-def _client() -> Client:
-    """
-    Crea cliente Appwrite (SDK).
-    Reemplaza todo lo que antes hacíamos con requests + headers.
-    """
+def _check_config():
     if not config.APPWRITE_API_KEY:
         raise RuntimeError("APPWRITE_API_KEY no cargada (revisa .env)")
     if not config.APPWRITE_ENDPOINT or not config.APPWRITE_PROJECT_ID:
         raise RuntimeError("Faltan APPWRITE_ENDPOINT / APPWRITE_PROJECT_ID (revisa .env)")
 
-    client = Client()
-    client.set_endpoint(config.APPWRITE_ENDPOINT)
-    client.set_project(config.APPWRITE_PROJECT_ID)
-    client.set_key(config.APPWRITE_API_KEY)
-    return client
 
-
-def _db() -> Databases:
+def _list_documents(collection_id: str, queries=None, limit=25):
     """
-    Servicio Databases del SDK.
+    Via gateway compartido (pool keep-alive). El limite viaja como Query.limit().
     """
-    return Databases(_client())
-
-
-def _list_documents(collection_id: str, queries=None, limit=25):
-    queries = queries or []
-
-    # ✅ En tu SDK: el limite se manda como Query.limit()
-    queries = queries + [Query.limit(limit)]
-
-    return _db().list_documents(
-        config.APPWRITE_DATABASE_ID,
-        collection_id,
-        queries
-    )
-
+    _check_config()
+    return list_documents(collection_id, queries=queries, limit=limit)
 
 
 def _create_document(collection_id: str, data: dict):
-    """
-    Igual que antes, pero con SDK.
-    """
+    _check_config()
     try:
-        return _db().create_document(
-            database_id=config.APPWRITE_DATABASE_ID,
-            collection_id=collection_id,
-            document_id="unique()",
-            data=data
-        )
+        return create_document(collection_id, data)
     except Exception as e:
         print("APPWRITE ERROR (create):", str(e))
         raise
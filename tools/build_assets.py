@@ -0,0 +1,206 @@
+# tools/build_assets.py
+"""
+Build de assets estaticos: copia con hash de contenido + gzip/brotli + manifest.
+
+    static/css/styles.css -> static/dist/css/styles.<hash>.css (+ .gz, + .br)
+
+La app lee static/dist/manifest.json (services/static_assets.py): static_url()
+apunta a la copia con hash y /assets/ la sirve como immutable con el encoding
+que acepte el navegador. Tambien extrae el CSS critico (navbar + layout base)
+para inlinearlo en el <head> si STATIC_INLINE_CRITICAL_CSS=1.
+
+Uso (desde la raiz del repo, antes de desplegar):
+    python tools/build_assets.py
+
+brotli es opcional (pip install brotli); sin el solo se generan .gz.
+
+Las copias con hash de builds anteriores NO se borran al toque: un navegador con
+HTML viejo en cache (o un 304) todavia las pide. Se conservan las de los ultimos
+KEEP_RELEASES builds: el manifest guarda sus entradas en "releases" y /assets/
+las sigue sirviendo. Lo mas viejo se borra.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# builds cuyas copias con hash se conservan en static/dist (incluido el actual)
+KEEP_RELEASES = 3
+
+SOURCE_DIRS = ["css", "js", "img"]
+# ya tienen hash / los maneja tools/build_images.py
+SKIP_DIRS = {"img/products", "img/derived"}
+EXTENSIONS = {".css", ".js", ".png", ".jpg", ".jpeg", ".webp", ".avif", ".svg", ".ico"}
+COMPRESSIBLE = {".css", ".js", ".svg"}
+
+# CSS critico: reglas de primer pintado (variables, base, navbar, contenedores)
+CRITICAL_CSS_SOURCE = "css/styles.css"
+CRITICAL_SELECTOR_PREFIXES = (
+    ":root", "*", "html", "body", "a", "img", "main",
+    ".navbar", ".navlink", ".navsearch", ".cartbtn", ".theme-toggle",
+    ".container", ".page-title", ".page-subtitle", ".hero", ".alert",
+)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _sources():
+    for source_dir in SOURCE_DIRS:
+        base = os.path.join(STATIC_DIR, source_dir)
+        for dirpath, dirnames, filenames in os.walk(base):
+            rel_dir = os.path.relpath(dirpath, STATIC_DIR).replace(os.sep, "/")
+            dirnames[:] = [d for d in dirnames if f"{rel_dir}/{d}" not in SKIP_DIRS]
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                    yield f"{rel_dir}/{name}"
+
+
+def _compress(path: str, data: bytes):
+    encodings = []
+
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(gz)
+        encodings.append("gzip")
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(br)
+            encodings.append("br")
+    return encodings
+
+
+def _critical_css(css: str) -> str:
+    """
+    Reglas de primer nivel cuyo selector empieza con CRITICAL_SELECTOR_PREFIXES
+    (se ignoran @media y demas at-rules). Simple, pero alcanza para el layout base.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    rules = []
+    depth = 0
+    start = 0
+    for i, ch in enumerate(css):
+        if ch == "{":
+            if depth == 0:
+                selector = css[start:i].strip()
+                body_start = i
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                if not selector.startswith("@"):
+                    selectors = [s.strip() for s in selector.split(",")]
+                    if all(s.startswith(CRITICAL_SELECTOR_PREFIXES) for s in selectors):
+                        body = re.sub(r"\s+", " ", css[body_start:i + 1])
+                        rules.append(f"{','.join(selectors)}{body}")
+                start = i + 1
+    return "\n".join(rules)
+
+
+def _previous_releases() -> list:
+    """
+    Entradas de assets ({path, hash, size, encodings}) de los builds anteriores,
+    una lista por build, el mas nuevo primero.
+    """
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if "releases" in manifest:
+        # builds viejos guardaban solo paths: sin hash no se pueden servir, se descartan
+        return [[a for a in release if isinstance(a, dict)] for release in manifest["releases"]]
+    # manifest sin historial: su build cuenta como el anterior
+    return [_release_entries(manifest.get("assets") or {})]
+
+
+def _release_entries(assets: dict) -> list:
+    return sorted(assets.values(), key=lambda a: a["path"])
+
+
+def _prune(releases: list):
+    """
+    Borra de dist los archivos que no pertenecen a ninguno de los builds conservados.
+    """
+    keep = {"manifest.json"}
+    for release in releases:
+        for asset in release:
+            path = asset["path"]
+            keep.update({path, f"{path}.gz", f"{path}.br"})
+
+    removed = 0
+    for dirpath, _, filenames in os.walk(DIST_DIR, topdown=False):
+        for name in filenames:
+            rel = os.path.relpath(os.path.join(dirpath, name), DIST_DIR).replace(os.sep, "/")
+            if rel not in keep:
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+        if dirpath != DIST_DIR and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
+
+
+def build() -> dict:
+    previous = _previous_releases()
+    os.makedirs(DIST_DIR, exist_ok=True)
+
+    assets = {}
+    for rel in _sources():
+        with open(os.path.join(STATIC_DIR, rel), "rb") as f:
+            data = f.read()
+
+        digest = _sha256(data)
+        stem, ext = os.path.splitext(rel)
+        out_rel = f"{stem}.{digest[:10]}{ext}"
+        out_abs = os.path.join(DIST_DIR, out_rel)
+        os.makedirs(os.path.dirname(out_abs), exist_ok=True)
+        with open(out_abs, "wb") as f:
+            f.write(data)
+
+        encodings = _compress(out_abs, data) if ext.lower() in COMPRESSIBLE else []
+        assets[rel] = {"path": out_rel, "hash": digest, "size": len(data), "encodings": encodings}
+        print("ok", rel, "->", out_rel, " ".join(encodings))
+
+    critical = ""
+    if CRITICAL_CSS_SOURCE in assets:
+        with open(os.path.join(STATIC_DIR, CRITICAL_CSS_SOURCE), encoding="utf-8") as f:
+            critical = _critical_css(f.read())
+
+    releases = [_release_entries(assets)] + previous
+    releases = releases[:KEEP_RELEASES]
+
+    manifest = {"assets": assets, "critical_css": critical, "releases": releases}
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+    # despues del manifest nuevo: nunca queda un manifest apuntando a algo borrado
+    removed = _prune(releases)
+
+    print(f"{len(assets)} assets, css critico: {len(critical)} bytes, {removed} archivos viejos borrados")
+    return manifest
+
+
+def main():
+    build()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# tools/build_images.py
+"""
+Build offline de derivados responsive para static/img/products.
+
+Por cada imagen genera varios anchos en WebP (y AVIF si Pillow lo soporta),
+con el hash del contenido en el nombre, y escribe un manifest que la app lee
+en runtime (services/image_manifest.py) para armar srcset/sizes.
+
+Uso (desde la raiz del repo, antes de desplegar):
+    python tools/build_images.py
+    python tools/build_images.py --force --workers 8
+
+Las imagenes cuyo hash no cambio (y cuyos derivados existen) se saltan.
+
+Los derivados de builds anteriores no se borran al toque (HTML en cache del
+navegador / CDN / fragment cache todavia los pide): se conservan los de los
+ultimos KEEP_RELEASES builds, anotados en releases.json, y se borra lo mas viejo
+recien despues de escribir el manifest nuevo.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "static")
+
+SOURCE_DIRS = ["img/products"]
+OUTPUT_DIR = "img/derived"
+MANIFEST_PATH = os.path.join(STATIC_DIR, OUTPUT_DIR, "manifest.json")
+RELEASES_PATH = os.path.join(STATIC_DIR, OUTPUT_DIR, "releases.json")
+
+# builds cuyos derivados se conservan (incluido el actual)
+KEEP_RELEASES = 3
+
+WIDTHS = [320, 480, 640, 960, 1280]
+QUALITY = {"webp": 78, "avif": 55}
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".avif"}
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _formats():
+    from PIL import features
+
+    # Pillow < 11.2: AVIF viene del plugin, que se registra al importarlo
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+
+    formats = ["webp"]
+    try:
+        if features.check("avif"):
+            formats.append("avif")
+    except Exception:
+        pass
+    return formats
+
+
+def _build_one(job):
+    """
+    Corre en un proceso del pool. Retorna (rel_path, entrada_del_manifest).
+    """
+    rel_path, digest, formats = job
+    from PIL import Image, ImageOps
+
+    src = os.path.join(STATIC_DIR, rel_path)
+    stem = os.path.splitext(os.path.basename(rel_path))[0]
+    short = digest[:10]
+
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        width, height = im.size
+
+        widths = [w for w in WIDTHS if w < width] + [min(width, WIDTHS[-1])]
+        widths = sorted(set(widths))
+
+        variants = {}
+        for fmt in formats:
+            variants[fmt] = []
+            for w in widths:
+                out_rel = f"{OUTPUT_DIR}/{stem}-{w}.{short}.{fmt}"
+                out_abs = os.path.join(STATIC_DIR, out_rel)
+                if not os.path.exists(out_abs):
+                    h = round(height * w / width)
+                    resized = im.resize((w, h), Image.LANCZOS) if w != width else im
+                    options = {"quality": QUALITY[fmt]}
+                    if fmt == "webp":
+                        options["method"] = 6
+                    resized.save(out_abs, fmt.upper(), **options)
+                variants[fmt].append([w, out_rel])
+
+    return rel_path, {
+        "hash": digest,
+        "width": width,
+        "height": height,
+        "variants": variants,
+    }
+
+
+def _load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _paths(manifest: dict) -> list:
+    return sorted({rel for e in manifest.values() for vs in e["variants"].values() for _, rel in vs})
+
+
+def _previous_releases() -> list:
+    """
+    Derivados de los builds anteriores (una lista de paths por build, el mas nuevo primero).
+    """
+    try:
+        with open(RELEASES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # sin historial: el manifest actual cuenta como el build anterior
+        old = _load_manifest()
+        return [_paths(old)] if old else []
+
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _is_fresh(entry: dict, digest: str, formats) -> bool:
+    if not entry or entry.get("hash") != digest:
+        return False
+    variants = entry.get("variants") or {}
+    for fmt in formats:
+        if not variants.get(fmt):
+            return False
+        for _, rel in variants[fmt]:
+            if not os.path.exists(os.path.join(STATIC_DIR, rel)):
+                return False
+    return True
+
+
+def build(force: bool = False, workers: int | None = None) -> dict:
+    os.makedirs(os.path.join(STATIC_DIR, OUTPUT_DIR), exist_ok=True)
+    formats = _formats()
+    previous = _previous_releases()
+    old = {} if force else _load_manifest()
+
+    manifest = {}
+    jobs = []
+    for source_dir in SOURCE_DIRS:
+        abs_dir = os.path.join(STATIC_DIR, source_dir)
+        for name in sorted(os.listdir(abs_dir)):
+            if os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+                continue
+            rel_path = f"{source_dir}/{name}"
+            digest = _sha256(os.path.join(abs_dir, name))
+            if _is_fresh(old.get(rel_path), digest, formats):
+                manifest[rel_path] = old[rel_path]
+            else:
+                jobs.append((rel_path, digest, formats))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rel_path, entry in pool.map(_build_one, jobs):
+                manifest[rel_path] = entry
+                print("ok", rel_path)
+
+    # primero el manifest nuevo: nunca queda apuntando a un archivo borrado
+    _write_json(MANIFEST_PATH, manifest)
+
+    releases = ([_paths(manifest)] + previous)[:KEEP_RELEASES]
+    _write_json(RELEASES_PATH, releases)
+
+    # borrar solo los derivados que no pertenecen a ningun build conservado
+    keep = {rel for release in releases for rel in release}
+    out_dir = os.path.join(STATIC_DIR, OUTPUT_DIR)
+    removed = 0
+    for name in os.listdir(out_dir):
+        rel = f"{OUTPUT_DIR}/{name}"
+        if name not in ("manifest.json", "releases.json") and not name.endswith(".tmp") and rel not in keep:
+            os.remove(os.path.join(out_dir, name))
+            removed += 1
+
+    print(
+        f"{len(jobs)} procesadas, {len(manifest) - len(jobs)} sin cambios, "
+        f"{removed} derivados viejos borrados, formatos: {', '.join(formats)}"
+    )
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera derivados responsive de static/img/products")
+    parser.add_argument("--force", action="store_true", help="regenerar todo aunque el hash no cambie")
+    parser.add_argument("--workers", type=int, default=None, help="procesos en paralelo (default: CPUs)")
+    args = parser.parse_args(argv)
+    build(force=args.force, workers=args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())